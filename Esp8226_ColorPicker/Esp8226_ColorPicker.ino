@@ -7,6 +7,12 @@
 #define LED_NUM 42
 #define LED_PIN D2
 #define BUFFER_LEN 1024
+#define LEDS_PER_PACKET 128
+
+/* -- Packet types, see color_picker_app/encoding.py -- */
+#define FIRST_ENCODED_TYPE 0xF0
+#define PACKET_RLE 0xF1
+#define PACKET_PALETTE 0xF2
 
 /* -- Wifi and Socket settings -- */
 WiFiUDP port;
@@ -24,9 +30,9 @@ unsigned int localPort = 7777;
 Adafruit_NeoPixel strip = Adafruit_NeoPixel(LED_NUM, LED_PIN, NEO_GRB + NEO_KHZ800);
 
 
-long unsigned int packetSize;
-unsigned int len;
-int r, g, b;
+uint8_t packetBuffer[BUFFER_LEN];
+int len;
+unsigned int ledsPerPacket = LEDS_PER_PACKET;
 
 void setup() {
 
@@ -54,35 +60,78 @@ void setup() {
   strip.show();
 }
 
-void loop() {
-  int packetSize = port.parsePacket();
+void setPixel(unsigned int index, uint8_t r, uint8_t g, uint8_t b) {
+  if (index < LED_NUM) {
+    RgbColor pixel(r, g, b);
+    strip.setPixelColor(index, pixel.G, pixel.B, pixel.R);
+  }
+}
 
-  if (packetSize) {
-    Serial.println(packetSize);
+/* [packetNo] r g b ... for the leds from packetNo * ledsPerPacket. The sender
+   sizes packets to its payload budget; packet 0 is never shorter than the
+   others, so it sets the stride. */
+void decodeRaw() {
+  if (packetBuffer[0] == 0 && len > 1) {
+    ledsPerPacket = (len - 1) / 3;
   }
+  unsigned int start = packetBuffer[0] * ledsPerPacket;
 
-  if (packetSize) {
-    char packetBuffer[packetSize];
-    len = port.read(packetBuffer, packetSize);
+  for (int i = 1; i + 2 < len; i += 3) {
+    setPixel(start + (i - 1) / 3, packetBuffer[i], packetBuffer[i + 1], packetBuffer[i + 2]);
+  }
+}
 
-    if (len > 0) {
-      packetBuffer[len] = 0;
+/* [RLE][index][count][start hi][start lo] then [run length] r g b records. */
+void decodeRle() {
+  unsigned int led = (packetBuffer[3] << 8) | packetBuffer[4];
+
+  for (int i = 5; i + 3 < len; i += 4) {
+    for (uint8_t n = 0; n < packetBuffer[i]; n++) {
+      setPixel(led++, packetBuffer[i + 1], packetBuffer[i + 2], packetBuffer[i + 3]);
     }
+  }
+}
 
-    Serial.println(packetBuffer);
+/* [PALETTE][index][count][start hi][start lo][leds hi][leds lo][size]
+   then size * r g b and one 4-bit palette index per led, high nibble first. */
+void decodePalette() {
+  unsigned int led = (packetBuffer[3] << 8) | packetBuffer[4];
+  unsigned int count = (packetBuffer[5] << 8) | packetBuffer[6];
+  uint8_t size = packetBuffer[7];
+  unsigned int indices = 8 + 3 * size;
 
-    for (int i = 0; i < len; i += 3) {
-      // r = (int)(byte *)(packetBuffer)[i];
-      // g = (int)(byte *)(packetBuffer)[i + 1];
-      // b = (int)(byte *)(packetBuffer)[i + 2];
-      RgbColor pixel((uint8_t)packetBuffer[i], (uint8_t)packetBuffer[i+1], (uint8_t)packetBuffer[i+2]);
-      
-      // strip.setPixelColor(i / 3, r, g, b);
-      strip.setPixelColor(i / 3, pixel.G, pixel.B, pixel.R);
+  if ((unsigned int)len < indices + (count + 1) / 2) {
+    return;
+  }
+
+  for (unsigned int n = 0; n < count; n++) {
+    uint8_t nibbles = packetBuffer[indices + n / 2];
+    uint8_t index = (n % 2) ? (nibbles & 0x0F) : (nibbles >> 4);
+    if (index >= size) {
+      return;
     }
+    uint8_t *color = &packetBuffer[8 + 3 * index];
+    setPixel(led + n, color[0], color[1], color[2]);
+  }
+}
 
+void loop() {
+  int packetSize = port.parsePacket();
 
-    strip.show();
-  }
+  if (packetSize) {
+    Serial.println(packetSize);
+    len = port.read(packetBuffer, BUFFER_LEN);
 
-}
\ No newline at end of file
+    if (len > 0) {
+      if (packetBuffer[0] < FIRST_ENCODED_TYPE) {
+        decodeRaw();
+      } else if (packetBuffer[0] == PACKET_RLE && len >= 5) {
+        decodeRle();
+      } else if (packetBuffer[0] == PACKET_PALETTE && len >= 8) {
+        decodePalette();
+      }
+
+      strip.show();
+    }
+  }
+}
@@ -0,0 +1,254 @@
+import time
+from functools import lru_cache
+from threading import Thread
+
+import numpy as np
+
+from scheduler import FrameScheduler
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+try:
+    import mss
+except ImportError:
+    mss = None
+
+
+# Capture sources return (height, width, 3) uint8 RGB frames from read(), or
+# None when they run out. Frames may be non-contiguous views.
+
+class SyntheticCapture():
+
+    # Hue bars scrolling horizontally over a vertical brightness ramp. Frames
+    # are views into one precomputed image, so producing them is free.
+
+    def __init__(self, width=1920, height=1080, speed=8, frames=None):
+        self.width = width
+        self.height = height
+        self.speed = speed
+        self.frames = frames
+        self._frame = 0
+
+        hue = np.arange(2 * width) * 6.0 / width % 6
+        rgb = np.clip(np.stack([np.abs(hue - 3) - 1, 2 - np.abs(hue - 2), 2 - np.abs(hue - 4)], axis=1), 0, 1)
+        ramp = np.linspace(1.0, 0.25, height)[:, None, None]
+        self._image = (ramp * rgb[None] * 255).astype(np.uint8)
+
+    def read(self):
+        if self.frames is not None and self._frame >= self.frames:
+            return None
+        shift = (self._frame * self.speed) % self.width
+        self._frame += 1
+        return self._image[:, shift:shift + self.width]
+
+    def close(self):
+        pass
+
+
+class VideoCapture():
+
+    # Video file or camera through OpenCV, converted from BGR by a view.
+
+    def __init__(self, path, loop=False):
+        if cv2 is None:
+            raise RuntimeError("OpenCV (cv2) is not installed")
+        self.path = path
+        self.loop = loop
+        self._capture = cv2.VideoCapture(path)
+        if not self._capture.isOpened():
+            raise OSError("could not open video %r" % path)
+
+    def read(self):
+        ok, frame = self._capture.read()
+        if not ok and self.loop:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._capture.read()
+        return frame[..., ::-1] if ok else None
+
+    def close(self):
+        self._capture.release()
+
+
+class ScreenCapture():
+
+    # Live screen grab through mss.
+
+    def __init__(self, monitor=1):
+        if mss is None:
+            raise RuntimeError("mss is not installed")
+        self._mss = mss.mss()
+        self.monitor = self._mss.monitors[monitor]
+
+    def read(self):
+        shot = self._mss.grab(self.monitor)
+        frame = np.frombuffer(shot.bgra, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        return frame[..., 2::-1]
+
+    def close(self):
+        self._mss.close()
+
+
+@lru_cache(maxsize=16)
+def zoneMap(width, height, top, right, bottom, left, depth=0.1, step=1, start=0):
+    # Precomputed sampling plan for one resolution and led layout. Each edge
+    # is a border band (rows, cols) summed across its depth and split into
+    # `count` zones along its length with reduceat. Zones are stored as
+    # top, right, bottom, left (each in increasing coordinate order); `order`
+    # maps them to leds running clockwise from the bottom-left corner,
+    # rotated by `start`.
+    dy = max(1, int(round(height * depth)))
+    dx = max(1, int(round(width * depth)))
+    edges = []
+    areas = []
+    offset = 0
+    for count, rows, cols, axis in (
+            (top, slice(0, dy, step), slice(0, width, step), 0),
+            (right, slice(0, height, step), slice(width - dx, width, step), 1),
+            (bottom, slice(height - dy, height, step), slice(0, width, step), 0),
+            (left, slice(0, height, step), slice(0, dx, step), 1)):
+        nrows = len(range(*rows.indices(height)))
+        ncols = len(range(*cols.indices(width)))
+        samples, across = (ncols, nrows) if axis == 0 else (nrows, ncols)
+        if count > samples:
+            raise ValueError("%d leds do not fit on an edge of %d samples" % (count, samples))
+        starts = (np.arange(count) * samples) // max(1, count)
+        ends = np.append(starts[1:], samples)
+        areas.append((ends - starts) * across)
+        bounds = tuple(zip(starts.tolist(), ends.tolist()))
+        edges.append((rows, cols, axis, starts, bounds, offset, count))
+        offset += count
+
+    areas = np.tile(np.concatenate(areas).astype(np.float32)[:, None], (1, 3))
+    t, r, b, l = (np.arange(count) + offset for _, _, _, _, _, offset, count in edges)
+    order = np.roll(np.concatenate([l[::-1], t, r, b[::-1]]), -start)
+    for array in (areas, order):
+        array.flags.writeable = False
+    return tuple(edges), areas, order
+
+
+class Ambilight():
+
+    # Capture-to-led pipeline: border zones of every frame are area averaged
+    # through a cached zoneMap, smoothed over time and streamed to a NeoPy
+    # strip. Leds run clockwise from the bottom-left corner of the screen
+    # (rotated by `start`) and fill the strip from its first pixel.
+
+    def __init__(self, strip, source, top, right, bottom, left, depth=0.1, smoothing=0.5,
+                 step=1, start=0, fps=60):
+        self.strip = strip
+        self.source = source
+        self.layout = (top, right, bottom, left)
+        self.depth = depth
+        self.step = step
+        self.startZone = start
+        self.smoothing = smoothing
+        self.leds = top + right + bottom + left
+        if self.leds > strip.numPixels():
+            raise ValueError("layout needs %d leds, strip has %d" % (self.leds, strip.numPixels()))
+
+        self._sums = {}
+        self._zoneSums = np.zeros((self.leds, 3), dtype=np.uint32)
+        self._zones = np.zeros((self.leds, 3), dtype=np.float32)
+        self._ordered = np.zeros((self.leds, 3), dtype=np.float32)
+        self.colors = np.zeros((self.leds, 3), dtype=np.float32)
+        self._first = True
+
+        self._scheduler = FrameScheduler(fps)
+        self.frames = 0
+        self._processing = 0.0
+        self._maxProcessing = 0.0
+        self._running = False
+        self._thread = None
+
+    def setSmoothing(self, smoothing):
+        # 0 follows the screen immediately, values towards 1 smooth harder.
+        self.smoothing = smoothing
+
+    def _buffer(self, shape):
+        buffer = self._sums.get(shape)
+        if buffer is None:
+            buffer = self._sums[shape] = np.zeros(shape, dtype=np.uint32)
+        return buffer
+
+    def sample(self, frame):
+        # Returns the area-averaged zone colors of a frame in led order.
+        height, width = frame.shape[:2]
+        edges, areas, order = zoneMap(width, height, *self.layout, self.depth, self.step, self.startZone)
+        for rows, cols, axis, starts, bounds, offset, count in edges:
+            if not count:
+                continue
+            band = frame[rows, cols]
+            out = self._zoneSums[offset:offset + count]
+            # Summing down whole rows is the fast direction, so horizontal edges
+            # are summed across their depth and then split into zones, while
+            # vertical edges sum each zone's rows and then the small remainder.
+            if axis == 0:
+                sums = self._buffer((band.shape[1], 3))
+                np.add.reduce(band, axis=0, dtype=np.uint32, out=sums)
+                np.add.reduceat(sums, starts, axis=0, out=out)
+            else:
+                sums = self._buffer((count, band.shape[1], 3))
+                for zone, (first, last) in enumerate(bounds):
+                    np.add.reduce(band[first:last], axis=0, dtype=np.uint32, out=sums[zone])
+                np.add.reduce(sums, axis=1, out=out)
+        np.divide(self._zoneSums, areas, out=self._zones)
+        np.take(self._zones, order, axis=0, out=self._ordered)
+        return self._ordered
+
+    def process(self, frame):
+        # Samples one frame, smooths it into self.colors and writes the strip.
+        zones = self.sample(frame)
+        if self._first:
+            np.copyto(self.colors, zones)
+            self._first = False
+        else:
+            np.subtract(zones, self.colors, out=zones)
+            zones *= 1.0 - self.smoothing
+            self.colors += zones
+        np.copyto(self.strip.pixels()[:self.leds], self.colors, casting='unsafe')
+
+    def stepFrame(self):
+        # Captures, processes and sends one frame; returns False when the
+        # source ran out.
+        frame = self.source.read()
+        if frame is None:
+            return False
+        start = time.perf_counter()
+        self.process(frame)
+        self.strip.show()
+        elapsed = time.perf_counter() - start
+        self.frames += 1
+        self._processing += elapsed
+        self._maxProcessing = max(self._maxProcessing, elapsed)
+        return True
+
+    def start(self):
+        self._running = True
+        self._scheduler.reset()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.source.close()
+
+    def _run(self):
+        while self._running and self.stepFrame():
+            self._scheduler.wait()
+        self._running = False
+
+    def stats(self):
+        mean = self._processing / self.frames if self.frames else 0.0
+        stats = self._scheduler.stats()
+        stats.update({
+            "processed": self.frames,
+            "processing_mean_ms": mean * 1000,
+            "processing_max_ms": self._maxProcessing * 1000,
+        })
+        return stats
@@ -0,0 +1,333 @@
+import inspect
+import time
+import wave
+from functools import lru_cache
+from threading import Thread
+
+import numpy as np
+
+from neopy import wheelPalette
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
+
+
+DEFAULT_RATE = 44100
+# 1024 samples is 23 ms of audio at 44.1 kHz, inside the 30 ms latency budget.
+DEFAULT_CHUNK = 1024
+
+_RFFT_OUT = "out" in inspect.signature(np.fft.rfft).parameters
+
+SCALES = ("linear", "log", "mel")
+
+
+def _toScale(freq, scale):
+    if scale == "log":
+        return np.log(freq)
+    elif scale == "mel":
+        return 2595.0 * np.log10(1.0 + freq / 700.0)
+    return freq
+
+
+def _fromScale(value, scale):
+    if scale == "log":
+        return np.exp(value)
+    elif scale == "mel":
+        return 700.0 * (10.0 ** (value / 2595.0) - 1.0)
+    return value
+
+
+@lru_cache(maxsize=32)
+def binMapping(rate, chunk, outputs, scale="log", fmin=30.0, fmax=16000.0):
+    # Sparse weight matrix from the chunk // 2 + 1 rfft bins to outputs
+    # (bands or leds), stored row by row as (bins, weights, rowStarts) so a
+    # mapping is one gather, one multiply and one reduceat. Rows are
+    # triangular filters evenly spaced on the scale, normalized to sum to 1;
+    # rows narrower than a bin interpolate between the two nearest bins.
+    if scale not in SCALES:
+        raise ValueError("unknown scale %r, expected one of %s" % (scale, ", ".join(SCALES)))
+    nbins = chunk // 2 + 1
+    fmax = min(fmax, rate / 2)
+    points = _fromScale(np.linspace(_toScale(fmin, scale), _toScale(fmax, scale), outputs + 2), scale)
+    points = points * chunk / rate
+
+    bins, weights, starts = [], [], []
+    for i in range(outputs):
+        lo, mid, hi = points[i], points[i + 1], points[i + 2]
+        k = np.arange(int(np.ceil(lo)), int(np.floor(hi)) + 1)
+        w = np.minimum((k - lo) / (mid - lo), (hi - k) / (hi - mid))
+        k, w = k[w > 0], w[w > 0]
+        if not len(k):
+            k0 = int(mid)
+            k, w = np.array([k0, k0 + 1]), np.array([1.0 - (mid - k0), mid - k0])
+        starts.append(len(bins))
+        bins.extend(np.minimum(k, nbins - 1))
+        weights.extend(w / w.sum())
+
+    mapping = (np.array(bins, dtype=np.intp), np.array(weights, dtype=np.float32),
+               np.array(starts, dtype=np.intp))
+    for array in mapping:
+        array.flags.writeable = False
+    return mapping
+
+
+def mapBins(magnitude, mapping, out, scratch=None):
+    # Applies a binMapping to a magnitude spectrum. Pass a float32 scratch of
+    # len(mapping[0]) to keep it allocation free.
+    bins, weights, starts = mapping
+    if scratch is None:
+        scratch = np.empty(len(bins), dtype=np.float32)
+    np.take(magnitude, bins, out=scratch)
+    np.multiply(scratch, weights, out=scratch)
+    np.add.reduceat(scratch, starts, out=out)
+    return out
+
+
+class SyntheticSource():
+
+    # Phase-continuous sum of sine tones plus optional noise, as 16-bit mono.
+    # With realtime=True read() paces itself like a sound card would.
+
+    def __init__(self, tones=((110.0, 0.5), (880.0, 0.2)), noise=0.0, rate=DEFAULT_RATE,
+                 chunk=DEFAULT_CHUNK, realtime=False, seed=None):
+        self.rate = rate
+        self.chunk = chunk
+        self.tones = list(tones)
+        self.noise = noise
+        self.realtime = realtime
+        self._random = np.random.default_rng(seed)
+        self._position = 0
+        self._t = np.arange(chunk) / rate
+        self._samples = np.zeros(chunk)
+        self._pcm = np.zeros(chunk, dtype='<i2')
+        self._next = None
+
+    def read(self):
+        self._samples[:] = 0
+        start = self._position / self.rate
+        for frequency, amplitude in self.tones:
+            self._samples += amplitude * np.sin(2 * np.pi * frequency * (self._t + start))
+        if self.noise:
+            self._samples += self._random.normal(0, self.noise, self.chunk)
+        np.clip(self._samples * 32767, -32768, 32767, out=self._samples)
+        self._pcm[:] = self._samples
+        self._position += self.chunk
+        _pace(self)
+        return self._pcm.tobytes()
+
+    def close(self):
+        pass
+
+
+class WavSource():
+
+    # 16-bit PCM WAV file, mixed down to mono. Returns None at the end of the
+    # file unless loop is set.
+
+    def __init__(self, path, chunk=DEFAULT_CHUNK, loop=False, realtime=False):
+        self._wav = wave.open(path, "rb")
+        if self._wav.getsampwidth() != 2:
+            raise ValueError("only 16-bit PCM WAV files are supported")
+        self.rate = self._wav.getframerate()
+        self.channels = self._wav.getnchannels()
+        self.chunk = chunk
+        self.loop = loop
+        self.realtime = realtime
+        self._next = None
+
+    def read(self):
+        data = self._wav.readframes(self.chunk)
+        if len(data) < self.chunk * self.channels * 2:
+            if not self.loop:
+                return None
+            self._wav.rewind()
+            data += self._wav.readframes(self.chunk - len(data) // (self.channels * 2))
+        if self.channels > 1:
+            frames = np.frombuffer(data, dtype='<i2').reshape(-1, self.channels)
+            data = frames.mean(axis=1).astype('<i2').tobytes()
+        _pace(self)
+        return data
+
+    def close(self):
+        self._wav.close()
+
+
+class PyAudioSource():
+
+    # Live input through PyAudio, defaulting to the "Stereo Mix" loopback
+    # device that tes.py used.
+
+    def __init__(self, rate=DEFAULT_RATE, chunk=DEFAULT_CHUNK, device=None):
+        if pyaudio is None:
+            raise RuntimeError("PyAudio is not installed")
+        self.rate = rate
+        self.chunk = chunk
+        self._audio = pyaudio.PyAudio()
+        if device is None:
+            device = self.getDeviceIndex()
+        self._stream = self._audio.open(
+            format=pyaudio.paInt16, channels=1, rate=rate, input=True,
+            frames_per_buffer=chunk, input_device_index=device)
+
+    def getDeviceIndex(self):
+        for i in range(self._audio.get_device_count()):
+            dev = self._audio.get_device_info_by_index(i)
+            if dev['name'] == 'Stereo Mix (Realtek(R) Audio)' and dev['hostApi'] == 0:
+                return dev['index']
+        return None
+
+    def read(self):
+        return self._stream.read(self.chunk, exception_on_overflow=False)
+
+    def close(self):
+        self._stream.stop_stream()
+        self._stream.close()
+        self._audio.terminate()
+
+
+def _pace(source):
+    # Sleeps until the current chunk would have been captured in real time.
+    if not source.realtime:
+        return
+    now = time.monotonic()
+    if source._next is None or now - source._next > 0.5:
+        source._next = now
+    source._next += source.chunk / source.rate
+    if source._next > now:
+        time.sleep(source._next - now)
+
+
+class AudioAnalyzer():
+
+    # Windowed rfft of each chunk into preallocated buffers, mapped onto
+    # bands through a cached binMapping, with automatic gain and attack/decay
+    # smoothing.
+
+    def __init__(self, rate=DEFAULT_RATE, chunk=DEFAULT_CHUNK, bands=16, fmin=30.0, fmax=16000.0,
+                 attack=0.6, decay=0.15, scale="log"):
+        self.rate = rate
+        self.chunk = chunk
+        self.bands = bands
+        self.attack = attack
+        self.decay = decay
+
+        nbins = chunk // 2 + 1
+        self.window = np.hanning(chunk).astype(np.float32)
+        self.windowed = np.zeros(chunk, dtype=np.float32)
+        self.spectrum = np.zeros(nbins, dtype=np.complex64)
+        self.magnitude = np.zeros(nbins, dtype=np.float32)
+
+        self.mapping = binMapping(rate, chunk, bands, scale, fmin, fmax)
+        self._scratch = np.zeros(len(self.mapping[0]), dtype=np.float32)
+        self._level = np.zeros(bands, dtype=np.float32)
+        self._rate = np.zeros(bands, dtype=np.float32)
+
+        self.energy = np.zeros(bands, dtype=np.float32)
+        self._peak = 1e-3
+
+    def analyze(self, data):
+        samples = np.frombuffer(data, dtype='<i2', count=self.chunk)
+        np.multiply(samples, self.window, out=self.windowed)
+        if _RFFT_OUT:
+            np.fft.rfft(self.windowed, out=self.spectrum)
+        else:
+            self.spectrum[:] = np.fft.rfft(self.windowed)
+        np.abs(self.spectrum, out=self.magnitude)
+
+        level = mapBins(self.magnitude, self.mapping, self._level, self._scratch)
+        np.log1p(level, out=level)
+        # Slowly decaying peak as automatic gain.
+        self._peak = max(float(level.max()), self._peak * 0.995, 1e-3)
+        level /= self._peak
+
+        rate = self._rate
+        np.greater(level, self.energy, out=rate)
+        rate *= self.attack - self.decay
+        rate += self.decay
+        np.subtract(level, self.energy, out=level)
+        level *= rate
+        self.energy += level
+        return self.energy
+
+
+class SpectrumRenderer():
+
+    # Maps band energies onto the strip: every led belongs to one band, colored
+    # along the wheel and scaled by the band's energy.
+
+    def __init__(self, leds, bands):
+        self.leds = leds
+        self.bands = bands
+        self.ledBand = (np.arange(leds) * bands) // max(1, leds)
+        palette = wheelPalette(256)
+        self.colors = palette[(self.ledBand * 170) // max(1, bands - 1) if bands > 1 else self.ledBand].astype(np.float32)
+        self._level = np.zeros((leds, 1), dtype=np.float32)
+        self._frame = np.zeros((leds, 3), dtype=np.float32)
+
+    def render(self, energy, out):
+        np.take(energy, self.ledBand, out=self._level[:, 0])
+        np.multiply(self.colors, self._level, out=self._frame)
+        np.copyto(out, self._frame, casting='unsafe')
+
+
+class AudioEngine():
+
+    # Reads chunks from a source, analyzes them and streams the result to a
+    # NeoPy strip on a background thread.
+
+    def __init__(self, strip, source, bands=16, renderer=None, scale="log"):
+        self.strip = strip
+        self.source = source
+        self.analyzer = AudioAnalyzer(source.rate, source.chunk, bands, scale=scale)
+        self.renderer = renderer or SpectrumRenderer(strip.numPixels(), bands)
+        self.chunks = 0
+        self._processing = 0.0
+        self._maxProcessing = 0.0
+        self._running = False
+        self._thread = None
+
+    def step(self):
+        # Processes one chunk; returns False when the source ran out.
+        data = self.source.read()
+        if not data:
+            return False
+        start = time.perf_counter()
+        energy = self.analyzer.analyze(data)
+        self.renderer.render(energy, self.strip.pixels())
+        self.strip.show()
+        elapsed = time.perf_counter() - start
+        self.chunks += 1
+        self._processing += elapsed
+        self._maxProcessing = max(self._maxProcessing, elapsed)
+        return True
+
+    def start(self):
+        self._running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.source.close()
+
+    def _run(self):
+        while self._running and self.step():
+            pass
+        self._running = False
+
+    def stats(self):
+        # Latency is one chunk of capture plus the processing of that chunk.
+        chunkTime = self.source.chunk / self.source.rate
+        mean = self._processing / self.chunks if self.chunks else 0.0
+        return {
+            "chunks": self.chunks,
+            "processing_mean_ms": mean * 1000,
+            "processing_max_ms": self._maxProcessing * 1000,
+            "latency_ms": (chunkTime + self._maxProcessing) * 1000,
+            "realtime_factor": chunkTime / mean if mean else 0.0,
+        }
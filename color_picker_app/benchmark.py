@@ -0,0 +1,323 @@
+"""
+Benchmarks the NeoPy render-and-send hot path against a localhost UDP sink.
+
+    python benchmark.py [--sizes 42 300 2000 10000] [--duration 1.0] [--json out.json]
+    python benchmark.py --e2e [--loss 0.02 --delay 0.003 --jitter 0.002]
+    python benchmark.py --audio [--sizes 42 300 2000]
+
+Every case reports frames/s, microseconds per frame, bytes/s and packets per
+frame as counted by the sink, and the transient bytes allocated per frame
+(the tracemalloc peak above the live heap, measured in a separate pass).
+With --e2e, frames are sent one at a time to a ReceiverEmulator instead, and
+the show()-to-frame-complete latency and packet loss are reported.
+With --audio, the per-chunk cost of mapping a 44.1 kHz / 1024-sample
+spectrum onto the leds is compared between the precomputed bin mapping and
+Python-level binning.
+"""
+
+import argparse
+import json
+import math
+import platform
+import socket
+import sys
+import time
+import tracemalloc
+from threading import Thread
+
+import numpy as np
+
+from neopy import NeoPy
+from client import Client
+import effects
+from emulator import ReceiverEmulator
+from audio import AudioAnalyzer, binMapping, mapBins, DEFAULT_RATE, DEFAULT_CHUNK
+
+
+DEFAULT_SIZES = [42, 300, 1000, 2000, 10000]
+AUDIO_SIZES = [42, 300, 2000]
+ALLOC_FRAMES = 20
+
+
+class UdpSink():
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self.packets = 0
+        self.bytes = 0
+        self._running = True
+        self._buffer = bytearray(65536)
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            try:
+                size = self.sock.recv_into(self._buffer)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.packets += 1
+            self.bytes += size
+
+    def reset(self):
+        self.packets = 0
+        self.bytes = 0
+
+    def settle(self):
+        # Waits until the sink stopped receiving, so counts include the tail.
+        last = -1
+        while last != self.packets:
+            last = self.packets
+            time.sleep(0.02)
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self.sock.close()
+
+
+def allocatedPerFrame(step):
+    tracemalloc.start()
+    total = 0
+    for frame in range(ALLOC_FRAMES):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        step(frame)
+        _, peak = tracemalloc.get_traced_memory()
+        total += peak - current
+    tracemalloc.stop()
+    return total / ALLOC_FRAMES
+
+
+def measure(name, numleds, step, sink, duration):
+    step(0)
+    allocated = allocatedPerFrame(step)
+
+    sink.settle()
+    sink.reset()
+    frames = 0
+    start = time.perf_counter()
+    while True:
+        step(frames)
+        frames += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            break
+    sink.settle()
+
+    return {
+        "case": name,
+        "leds": numleds,
+        "frames": frames,
+        "fps": frames / elapsed,
+        "us_per_frame": elapsed / frames * 1e6,
+        "bytes_per_s": sink.bytes / elapsed,
+        "packets_per_frame": sink.packets / frames,
+        "alloc_bytes_per_frame": allocated,
+    }
+
+
+def cases(numleds, port, budget=None):
+    strip = NeoPy(numleds, "127.0.0.1", port, payloadBudget=budget)
+    strip.setBrightness(80)
+
+    def setAll(frame):
+        strip.setAll((frame & 255, 128, 255 - (frame & 255)))
+
+    def show(frame):
+        strip.show()
+
+    w = max(1, int(math.sqrt(numleds)))
+    h = max(1, numleds // w)
+    strip.isMatrix(True, 1, w, h, 0)
+
+    def setPixel(frame):
+        value = (frame & 255, 0, 0)
+        for y in range(h):
+            for x in range(w):
+                strip.setPixel(x, y, value)
+
+    image = np.zeros((h, w, 3), dtype=np.uint8)
+
+    def blit(frame):
+        image[:] = (frame & 255, 0, 0)
+        strip.blit(image)
+
+    yield "NeoPy.show", show
+    yield "NeoPy.setAll", setAll
+    yield "NeoPy.setPixel(%dx%d)" % (w, h), setPixel
+    yield "NeoPy.blit(%dx%d)" % (w, h), blit
+
+    for name in effects.names():
+        client = Client(numleds, 80, "127.0.0.1", port, payloadBudget=budget)
+        yield "Animations.%s" % name, lambda frame, client=client, name=name: client.animationFrame(name, frame)
+
+
+def endToEnd(numleds, frames, loss, delay, jitter, budget=None):
+    with ReceiverEmulator(numleds, loss=loss, delay=delay, jitter=jitter, seed=0) as rx:
+        strip = NeoPy(numleds, "127.0.0.1", rx.port, payloadBudget=budget)
+        rx.waitFrames(1)
+        rx.reset()
+
+        latencies = []
+        timeout = 0.05 + delay + jitter
+        start = time.perf_counter()
+        for frame in range(frames):
+            strip.setAll((frame & 255, 64, 255 - (frame & 255)))
+            before = len(rx.frames)
+            sent = time.perf_counter()
+            strip.show()
+            for received in rx.waitFrames(before + 1, timeout)[before:]:
+                if received.complete and received.first >= sent:
+                    latencies.append(received.last - sent)
+        elapsed = time.perf_counter() - start
+        time.sleep(timeout)
+        stats = rx.stats()
+
+    latencies = np.array(latencies) if latencies else np.full(1, np.nan)
+    return {
+        "case": "end-to-end",
+        "leds": numleds,
+        "frames": frames,
+        "fps": frames / elapsed,
+        "latency_mean_us": float(np.mean(latencies)) * 1e6,
+        "latency_p50_us": float(np.percentile(latencies, 50)) * 1e6,
+        "latency_p99_us": float(np.percentile(latencies, 99)) * 1e6,
+        "complete_frames": stats["complete_frames"],
+        "packet_loss": stats["packet_loss"],
+        "reordered": stats["reordered"],
+    }
+
+
+def timePerCall(step, duration):
+    step()
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        step()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return elapsed / calls * 1e6
+
+
+def audioMapping(numleds, duration, scale="log"):
+    rng = np.random.default_rng(0)
+    magnitude = rng.random(DEFAULT_CHUNK // 2 + 1).astype(np.float32)
+    out = np.zeros(numleds, dtype=np.float32)
+
+    start = time.perf_counter()
+    binMapping.cache_clear()
+    mapping = binMapping(DEFAULT_RATE, DEFAULT_CHUNK, numleds, scale)
+    build = time.perf_counter() - start
+    bins, weights, starts = mapping
+    scratch = np.zeros(len(bins), dtype=np.float32)
+    ends = list(starts[1:]) + [len(bins)]
+
+    def matrix():
+        mapBins(magnitude, mapping, out, scratch)
+
+    # Reference: the same weights applied bin by bin from Python.
+    def python():
+        for led in range(numleds):
+            total = 0.0
+            for j in range(starts[led], ends[led]):
+                total += magnitude[bins[j]] * weights[j]
+            out[led] = total
+
+    analyzer = AudioAnalyzer(DEFAULT_RATE, DEFAULT_CHUNK, numleds, scale=scale)
+    chunk = (rng.standard_normal(DEFAULT_CHUNK) * 8000).astype('<i2').tobytes()
+
+    return {
+        "case": "audio-mapping",
+        "leds": numleds,
+        "scale": scale,
+        "nonzero_weights": len(bins),
+        "build_ms": build * 1000,
+        "matrix_us_per_chunk": timePerCall(matrix, duration),
+        "python_us_per_chunk": timePerCall(python, duration),
+        "analyze_us_per_chunk": timePerCall(lambda: analyzer.analyze(chunk), duration),
+        "chunk_budget_us": DEFAULT_CHUNK / DEFAULT_RATE * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NeoPy render-and-send benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+")
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds per case")
+    parser.add_argument("--json", help="write results to this file as JSON")
+    parser.add_argument("--budget", type=int, help="datagram payload budget in bytes (default: 128 leds per packet)")
+    parser.add_argument("--e2e", action="store_true", help="measure latency and loss against the receiver emulator")
+    parser.add_argument("--frames", type=int, default=500, help="frames per size with --e2e")
+    parser.add_argument("--loss", type=float, default=0.0, help="simulated packet loss with --e2e")
+    parser.add_argument("--delay", type=float, default=0.0, help="simulated one-way delay (s) with --e2e")
+    parser.add_argument("--jitter", type=float, default=0.0, help="simulated delay jitter (s) with --e2e")
+    parser.add_argument("--audio", action="store_true", help="measure the spectrum-to-led mapping per audio chunk")
+    args = parser.parse_args()
+
+    if args.sizes is None:
+        args.sizes = AUDIO_SIZES if args.audio else DEFAULT_SIZES
+
+    if args.audio:
+        results = []
+        print("%-14s %6s %8s %10s %12s %12s %12s" % (
+            "case", "leds", "weights", "build ms", "matrix us", "python us", "analyze us"))
+        for numleds in args.sizes:
+            result = audioMapping(numleds, args.duration)
+            results.append(result)
+            print("%-14s %6d %8d %10.2f %12.1f %12.1f %12.1f" % (
+                result["case"], numleds, result["nonzero_weights"], result["build_ms"],
+                result["matrix_us_per_chunk"], result["python_us_per_chunk"], result["analyze_us_per_chunk"]))
+        writeJson(args.json, results)
+        return
+
+    if args.e2e:
+        results = []
+        print("%-12s %6s %10s %10s %10s %10s %8s %6s" % (
+            "case", "leds", "frames/s", "mean us", "p50 us", "p99 us", "loss", "reord"))
+        for numleds in args.sizes:
+            result = endToEnd(numleds, args.frames, args.loss, args.delay, args.jitter, args.budget)
+            results.append(result)
+            print("%-12s %6d %10.1f %10.1f %10.1f %10.1f %8.3f %6d" % (
+                result["case"], numleds, result["fps"], result["latency_mean_us"], result["latency_p50_us"],
+                result["latency_p99_us"], result["packet_loss"], result["reordered"]))
+        writeJson(args.json, results)
+        return
+
+    sink = UdpSink()
+    results = []
+    print("%-28s %6s %10s %10s %12s %8s %10s" % (
+        "case", "leds", "frames/s", "us/frame", "bytes/s", "pkt/frm", "alloc B"))
+    try:
+        for numleds in args.sizes:
+            for name, step in cases(numleds, sink.port, args.budget):
+                result = measure(name, numleds, step, sink, args.duration)
+                results.append(result)
+                print("%-28s %6d %10.1f %10.1f %12.0f %8.2f %10.0f" % (
+                    name, numleds, result["fps"], result["us_per_frame"], result["bytes_per_s"],
+                    result["packets_per_frame"], result["alloc_bytes_per_frame"]))
+    finally:
+        sink.close()
+
+    writeJson(args.json, results)
+
+
+def writeJson(path, results):
+    if path:
+        with open(path, "w") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "numpy": np.__version__,
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,84 +3,193 @@ from concurrent.futures import thread
 from tkinter.tix import Tree
 from neopy import NeoPy
 from enum import Enum
-from threading import Thread
-import random
-import time
+from threading import Thread, Lock
+from scheduler import FrameScheduler
+from framecache import FrameCache
+from gradient import DEFAULT_GRADIENT, gradientKey, renderGradient
+import effects
+from transitions import StaticFrame, Transition
 
 
 class Animations(Enum):
+
+    # Kept for callers that name the built-in effects through the enum; the
+    # members resolve by .name through effects.lookup. The effect registry is
+    # the full list of animations, and effects added elsewhere (by plugins or
+    # other modules) have no member here.
+
     SPARKLING_STAR = 1,
     RUNNING_RAINBOW = 2,
     COLOR_FADE = 3
+    GRADIENT_SCROLL = 4
 
     @staticmethod
     def from_str(text):
-        statuses = [animation for animation in dir(
-            Animations) if not animation.startswith('_')]
-        if text in statuses:
-            return getattr(Animations, text)
-        return None
+        # Returns the Animations member named `text`, the registered Effect
+        # subclass for effects without one, or None for unknown names.
+        if text in Animations.__members__:
+            return Animations[text]
+        return effects.get(text)
 
 
 class Client(NeoPy):
-    def __init__(self, leds, brighness, ip, port):
-        NeoPy.__init__(self, leds, ip, port)
+    def __init__(self, leds, brighness, ip, port, skipUnchanged=False, payloadBudget=None):
+        NeoPy.__init__(self, leds, ip, port, skipUnchanged=skipUnchanged, payloadBudget=payloadBudget)
 
+        self.frameCache = FrameCache()
         self.setBrightness(brighness)
         self._animationWorkerSatus = False
-
-    def setColor(self, color):
+        self._scheduler = FrameScheduler()
+        self._effects = {}
+        self._current = None
+        self._driverLock = Lock()
+        self.gradient = DEFAULT_GRADIENT
+
+    def setStrip(self, leds, brightness, ip, port):
+        NeoPy.setStrip(self, leds, brightness, ip, port)
+        self.frameCache.clear()
+
+    def setBrightness(self, value):
+        brightness = self.brightness
+        NeoPy.setBrightness(self, value)
+        if self.brightness != brightness:
+            self.frameCache.clear()
+
+    def setColor(self, color, duration=0):
+        if duration or (self.isAnimating() and isinstance(self._current, Transition)):
+            self.transition(StaticFrame(self, color), duration)
+            return
         self.setAll(color)
         self.show()
 
-    def setGradient(self, colors, points):
-        pass
+    def setGradient(self, colors, points, duration=0):
+        self.gradient = gradientKey(points, colors)
+        gradient = renderGradient(*self.gradient, self.numPixels())
+        if duration or (self.isAnimating() and isinstance(self._current, Transition)):
+            self.transition(StaticFrame(self, gradient), duration)
+            return
+        self.strip[:] = gradient
+        self.show()
 
-    def startAnimation(self, mode, delay=None):
+    def startAnimation(self, mode, delay=None, duration=0):
+        effect = self.effect(mode)
+        if duration:
+            self.transition(effect, duration, delay=delay)
+            return
+        with self._driverLock:
+            if self.isAnimating():
+                # Take over the running driver loop (e.g. a fade still in
+                # progress) instead of starting a second one on the strip.
+                self._scheduler.setPeriod(delay or 0.04)
+                self._scheduler.reset()
+                self._current = effect
+                return
         self._animationWorkerSatus = True
-        self._animationWorker = Thread(target=lambda: self._setAnimation(mode, delay))
+        self._animationWorker = Thread(target=lambda: self._setAnimation(effect, delay))
         self._animationWorker.daemon = True
         self._animationWorker.start()
 
-    def stopAnimation(self):
+    def stopAnimation(self, duration=0):
+        # With a duration, fades the strip out before the loop ends.
+        if duration and self.isAnimating():
+            self.transition(StaticFrame(self, (0, 0, 0)), duration)
+            return
         self._animationWorkerSatus = False
 
-    def _setAnimation(self, mode, delay=0.04):
+    def isAnimating(self):
+        worker = getattr(self, "_animationWorker", None)
+        return self._animationWorkerSatus and worker is not None and worker.is_alive()
+
+    def transition(self, target, duration=0.5, easing="smooth", delay=None):
+        # Crossfades from the frame currently on the strip to `target` (an
+        # effect or animation mode, or a StaticFrame) over `duration` seconds.
+        # A running driver loop switches to the transition on its next frame,
+        # interrupting any transition in progress; otherwise the animation
+        # thread is started for it. Static targets end the loop once reached.
+        target = self.effect(target)
+        with self._driverLock:
+            if self.isAnimating():
+                period = self._scheduler.period
+                self._current = Transition(self, target, round(duration / period), easing)
+                return
+        period = delay or 0.04
+        self.startAnimation(Transition(self, target, round(duration / period), easing), period)
+
+    def animationStats(self):
+        return self._scheduler.stats()
+
+    def effect(self, mode):
+        # This client's instance of an effect (see effects.lookup for what
+        # `mode` can be), created on first use.
+        if isinstance(mode, effects.Effect):
+            return mode
+        effect = effects.lookup(mode)
+        instance = self._effects.get(effect.name)
+        if type(instance) is not effect:
+            instance = self._effects[effect.name] = effect(self)
+        return instance
+
+    def _cacheKey(self, effect, frame):
+        # Periodic effects repeat every `period` frames, so their encoded
+        # frames can be replayed from the cache when a whole cycle fits in it.
+        period = effect.period()
+        if period is None:
+            return None
+
+        # Dithered output differs on every pass, so it can't be replayed, and
+        # cached frames are raw packets, which would bypass compression.
+        if self.dithering or self.compression:
+            return None
+
+        if not self.frameCache.canHold(period * (self.strip.nbytes + len(self._packetBuffer))):
+            return None
+        return (effect.name, self.numPixels(), self.brightness, self.gamma, self.ledsPerPacket,
+                self.payloadBudget, effect.params(), frame % period)
+
+    def animationFrame(self, mode, frame):
+        # Renders frame `frame` of an effect into the strip and sends it.
+        effect = self.effect(mode)
+        key = self._cacheKey(effect, frame)
+        cached = self.frameCache.get(key) if key else None
+        if cached:
+            self.showEncoded(*cached)
+            return
+
+        effect.render(frame, self.strip)
+
+        if key:
+            rendered = self.strip.copy()
+            encoded = self.encodeFrame()
+            self.frameCache.put(key, rendered, encoded)
+            self.showEncoded(rendered, encoded)
+        else:
+            self.show()
+
+    def play(self, mode, delay=None):
+        # The driver loop, as a generator: renders and sends one frame per
+        # scheduler tick and yields its index. The delay is the target frame
+        # period; frames are rendered at the scheduler's timeline index, so
+        # skipped frames keep the pace. Stop iterating to end the animation.
+        # The effect can be swapped for a transition while playing.
+        self._current = self.effect(mode)
+        self._scheduler.setPeriod(delay or 0.04)
+        self._scheduler.reset()
+        frame = 0
+        while True:
+            effect = self._current
+            self.animationFrame(effect, frame)
+            if isinstance(effect, Transition) and effect.finished:
+                with self._driverLock:
+                    if self._current is effect:
+                        if effect.next is None:
+                            self._current = None
+                            self._animationWorkerSatus = False
+                            return
+                        self._current = effect.next
+            yield frame
+            frame = self._scheduler.wait()
 
-        # Type checking
-        if mode and not isinstance(mode, Animations):
-            raise TypeError(
-                'animation mode must be an instance of Animations Enum')
-
-        while self._animationWorkerSatus:
-            if mode == Animations.SPARKLING_STAR:
-                self.setBrightness(self.brightness)
-                self.setAll((10, 10, 10))
-
-                pixel = random.randrange(self.numPixels())
-                self.set(pixel, (255, 255, 255))
-                self.show()
-
-                time.sleep(delay)
-                self.set(pixel, (180, 180, 180))
-                self.show()
-                time.sleep(delay)
-
-            elif mode == Animations.RUNNING_RAINBOW:
-                self.setBrightness(self.brightness)
-                conv = 256 / self.numPixels()
-                for j in range(self.numPixels()):
-                    for i in range(self.numPixels()):
-                        loc = (i+j) % self.numPixels()
-                        wh = self.wheel(loc * conv)
-                        self.set(i, wh)
-                    self.show()
-                    time.sleep(delay)
-
-            elif mode == Animations.COLOR_FADE:
-                self.setBrightness(self.brightness)
-                for i in range(256):
-                    for j in range(self.numPixels()):
-                        self.setAll(self.wheel(i))
-                    self.show()
-                    time.sleep(delay)
\ No newline at end of file
+    def _setAnimation(self, mode, delay=0.04):
+        for _ in self.play(mode, delay):
+            if not self._animationWorkerSatus:
+                break
@@ -0,0 +1,88 @@
+import time
+from threading import Thread, Condition
+
+
+class CoalescingSender():
+
+    # Latest-wins hand-off between the GUI and the network. post() drops the
+    # call into a single-slot mailbox and returns immediately; a background
+    # thread runs whatever is in the slot, at most maxRate times a second.
+    # A newer post replaces an unsent one, so intermediate states (a slider
+    # being dragged) are dropped rather than queued. Calls that raise are
+    # counted in `errors` instead of `sent` and handed to onError(exception),
+    # which runs on the sender thread.
+
+    def __init__(self, maxRate=30, onError=None):
+        self.setMaxRate(maxRate)
+        self.onError = onError
+        self.posted = 0
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+        self._slot = None
+        self._busy = False
+        self._nextSend = 0.0
+        self._running = True
+        self._condition = Condition()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def setMaxRate(self, maxRate):
+        self.maxRate = maxRate
+        self.interval = 1.0 / maxRate if maxRate else 0.0
+
+    def post(self, func, *args):
+        with self._condition:
+            if self._slot is not None:
+                self.dropped += 1
+            self._slot = (func, args)
+            self.posted += 1
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        # Waits until the slot is empty and nothing is being sent, so a
+        # synchronous call can follow without racing the sender thread.
+        with self._condition:
+            return self._condition.wait_for(lambda: self._slot is None and not self._busy, timeout)
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+
+    def stats(self):
+        return {"posted": self.posted, "sent": self.sent, "dropped": self.dropped, "errors": self.errors}
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._slot is not None or not self._running)
+                # Hold off until the rate allows a send; posts arriving in the
+                # meantime replace the slot.
+                while self._running:
+                    delay = self._nextSend - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(delay)
+                if not self._running:
+                    return
+                func, args = self._slot
+                self._slot = None
+                self._busy = True
+
+            failed = None
+            try:
+                func(*args)
+            except Exception as e:
+                failed = e
+            with self._condition:
+                self._busy = False
+                if failed is None:
+                    self.sent += 1
+                else:
+                    self.errors += 1
+                self._nextSend = time.monotonic() + self.interval
+                self._condition.notify_all()
+            if failed is not None and self.onError is not None:
+                self.onError(failed)
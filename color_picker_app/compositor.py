@@ -0,0 +1,187 @@
+import numpy as np
+
+
+# Blend modes as coefficients of one affine step per layer. With a the
+# layer's alpha times opacity and s its color, every mode maps the color
+# below it, d, to
+#     d' = (1 - a * (k1 - k2 * s)) * d + a * k3 * s
+# normal: d + a(s - d), add: d + a s, multiply: d + a(d s - d). max isn't
+# affine and is applied between runs of the others.
+BLEND_MODES = {
+    "normal": (1.0, 0.0, 1.0),
+    "add": (0.0, 0.0, 1.0),
+    "multiply": (1.0, 1.0, 0.0),
+    "max": None,
+}
+
+
+class Layer():
+
+    # One compositor layer. color is an (N, 3) float32 array in 0..1 and
+    # alpha an (N,) float32 array in 0..1, both views into the compositor's
+    # stacked buffers, so write them in place.
+
+    def __init__(self, compositor, index, name, mode, opacity):
+        self._compositor = compositor
+        self.index = index
+        self.name = name
+        self.mode = mode
+        self.opacity = opacity
+        self._scratch = None
+
+    @property
+    def color(self):
+        return self._compositor._colors[self.index]
+
+    @property
+    def alpha(self):
+        return self._compositor._alpha[self.index, :, 0]
+
+    def setMode(self, mode):
+        if mode not in BLEND_MODES:
+            raise ValueError("unknown blend mode %r, expected one of %s" % (mode, ", ".join(BLEND_MODES)))
+        self.mode = mode
+        self._compositor._dirty = True
+
+    def setOpacity(self, opacity):
+        self.opacity = float(opacity)
+        self._compositor._dirty = True
+
+    def fill(self, color, alpha=1.0):
+        # One 0..255 RGB color over the whole layer.
+        self.color[:] = np.asarray(color, dtype=np.float32) / 255
+        self.alpha[:] = alpha
+
+    def write(self, rgb, alpha=None):
+        # Copies an (N, 3) 0..255 frame into the layer, optionally with alpha.
+        np.multiply(rgb, 1 / 255, out=self.color, casting='unsafe')
+        if alpha is not None:
+            self.alpha[:] = alpha
+
+    def draw(self, effect, frame, alpha=None):
+        # Renders frame `frame` of an Effect into the layer.
+        if self._scratch is None or len(self._scratch) != len(self.color):
+            self._scratch = np.zeros(self.color.shape, dtype=np.uint8)
+        effect.render(frame, self._scratch)
+        self.write(self._scratch, alpha)
+
+
+class Compositor():
+
+    # Stack of layers flattened bottom to top into a NeoPy framebuffer. All
+    # layers live in (layers, N, ...) arrays, and runs of normal, add and
+    # multiply layers are flattened together as a composition of affine maps,
+    # so a frame costs a fixed number of NumPy calls however many layers
+    # there are. Intermediate values aren't clamped; the result is clipped
+    # once when it's written out.
+
+    def __init__(self, leds):
+        self.leds = leds
+        self.layers = []
+        self._colors = np.zeros((0, leds, 3), dtype=np.float32)
+        self._alpha = np.zeros((0, leds, 1), dtype=np.float32)
+        self._dirty = True
+
+    def addLayer(self, name=None, mode="normal", opacity=1.0):
+        if mode not in BLEND_MODES:
+            raise ValueError("unknown blend mode %r, expected one of %s" % (mode, ", ".join(BLEND_MODES)))
+        count = len(self.layers)
+        colors = np.zeros((count + 1, self.leds, 3), dtype=np.float32)
+        alpha = np.zeros((count + 1, self.leds, 1), dtype=np.float32)
+        colors[:count] = self._colors
+        alpha[:count] = self._alpha
+        self._colors, self._alpha = colors, alpha
+        layer = Layer(self, count, name, mode, float(opacity))
+        self.layers.append(layer)
+        self._dirty = True
+        return layer
+
+    def removeLayer(self, layer):
+        keep = [other.index for other in self.layers if other is not layer]
+        self._colors = self._colors[keep]
+        self._alpha = self._alpha[keep]
+        self.layers.remove(layer)
+        for index, other in enumerate(self.layers):
+            other.index = index
+        self._dirty = True
+
+    def layer(self, name):
+        for layer in self.layers:
+            if layer.name == name:
+                return layer
+        return None
+
+    def _prepare(self):
+        # Per-layer coefficients and scratch buffers, rebuilt only when the
+        # stack, a mode or an opacity changes.
+        count = len(self.layers)
+        shape = (count, self.leds, 3)
+        self._runs = []
+        start = 0
+        for layer in self.layers:
+            if layer.mode == "max":
+                if layer.index > start:
+                    self._runs.append((start, layer.index))
+                self._runs.append((layer.index, None))
+                start = layer.index + 1
+        if start < count:
+            self._runs.append((start, count))
+
+        k = np.array([BLEND_MODES[layer.mode] or (0.0, 0.0, 0.0) for layer in self.layers],
+                     dtype=np.float32).reshape(count, 3, 1, 1)
+        self._k1, self._k2, self._k3 = k[:, 0], k[:, 1], k[:, 2]
+        self._opacity = np.array([layer.opacity for layer in self.layers],
+                                 dtype=np.float32).reshape(count, 1, 1)
+        self._a = np.zeros((count, self.leds, 1), dtype=np.float32)
+        self._A = np.zeros(shape, dtype=np.float32)
+        self._B = np.zeros(shape, dtype=np.float32)
+        self._suffix = np.zeros(shape, dtype=np.float32)
+        self._result = np.zeros((self.leds, 3), dtype=np.float32)
+        self._dirty = False
+
+    def composite(self):
+        # Flattens the stack over black into a (N, 3) float32 array in 0..1.
+        if self._dirty:
+            self._prepare()
+        result = self._result
+        result[:] = 0
+        if not self.layers:
+            return result
+
+        a, A, B = self._a, self._A, self._B
+        np.multiply(self._alpha, self._opacity, out=a)
+        # A = 1 - a * (k1 - k2 * s), B = a * k3 * s for every layer at once.
+        np.multiply(self._colors, self._k2, out=A)
+        np.subtract(self._k1, A, out=A)
+        A *= a
+        np.subtract(1.0, A, out=A)
+        np.multiply(self._colors, self._k3, out=B)
+        B *= a
+
+        for start, end in self._runs:
+            if end is None:
+                # max: d + a * (max(d, s) - d)
+                maximum = np.maximum(result, self._colors[start])
+                maximum -= result
+                maximum *= a[start]
+                result += maximum
+                continue
+            # d' = P[start] * d + sum(B[i] * P[i + 1]), with P the suffix
+            # products of A over the run (P[end] = 1).
+            suffix = self._suffix[start:end]
+            np.cumprod(A[start:end][::-1], axis=0, out=suffix[::-1])
+            result *= suffix[0]
+            result += B[end - 1]
+            if end - start > 1:
+                np.multiply(B[start:end - 1], suffix[1:], out=A[start:end - 1])
+                result += A[start:end - 1].sum(axis=0)
+        return result
+
+    def flatten(self, out):
+        # Composites into a uint8 (N, 3) buffer such as NeoPy.pixels().
+        result = self.composite()
+        np.clip(result, 0.0, 1.0, out=result)
+        result *= 255
+        result += 0.5
+        np.copyto(out, result, casting='unsafe')
+        return out
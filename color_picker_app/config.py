@@ -6,6 +6,9 @@ DEFAULT_UDP_IP = "192.168.0.101"
 DEFAULT_UDP_PORT = "7777"
 DEFAULT_LEDS_NUM = "42"
 DEFAULT_LEDS_BRIGHTNESS = "255"
+DEFAULT_ISOLATED_RENDERER = "false"
+DEFAULT_FADE_DURATION = "0.5"
+DEFAULT_MAX_SEND_RATE = "30"
 
 class PickerConfigs(ConfigParser):
     def __init__(self, name):
@@ -18,6 +21,9 @@ class PickerConfigs(ConfigParser):
             "default_udp_port": DEFAULT_UDP_PORT, 
             "default_leds_count": DEFAULT_LEDS_NUM,
             "default_leds_brightness": DEFAULT_LEDS_BRIGHTNESS,
+            "isolated_renderer": DEFAULT_ISOLATED_RENDERER,
+            "fade_duration": DEFAULT_FADE_DURATION,
+            "max_send_rate": DEFAULT_MAX_SEND_RATE,
         }
 
     def create(self):
@@ -0,0 +1,162 @@
+import random
+
+import numpy as np
+
+from neopy import wheelPalette
+from gradient import renderGradient
+from compositor import Compositor
+
+
+# Registered effect classes by name, in registration order. The animation
+# combobox and Animations.from_str are populated from this.
+_registry = {}
+
+
+def register(effect):
+    # Class decorator adding an Effect subclass to the registry under its name.
+    _registry[effect.name] = effect
+    return effect
+
+
+def names():
+    return list(_registry)
+
+
+def get(name):
+    return _registry.get(name)
+
+
+def lookup(mode):
+    # Resolves an Effect subclass, a registered name or anything with a
+    # registered .name (like an Animations member) to its Effect subclass.
+    if isinstance(mode, type) and issubclass(mode, Effect):
+        return mode
+    effect = get(mode if isinstance(mode, str) else getattr(mode, "name", None))
+    if effect is None:
+        raise TypeError("unknown animation %r, expected one of %s" % (mode, ", ".join(names())))
+    return effect
+
+
+class Effect():
+
+    # An effect renders frame `frame` of its timeline into a provided (N, 3)
+    # uint8 buffer; the driver loop owns timing, caching and sending. One
+    # instance is created per client, so effects may keep state between frames.
+
+    name = None
+
+    def __init__(self, client):
+        self.client = client
+
+    def period(self):
+        # Number of frames after which the output repeats, or None. Periodic
+        # effects have their encoded frames replayed from the frame cache.
+        return None
+
+    def params(self):
+        # Hashable parameters that change the output, for the cache key.
+        return None
+
+    def render(self, frame, out):
+        raise NotImplementedError
+
+
+def _rotate(out, frame, source):
+    # Writes `source` rotated left by `frame` leds.
+    numleds = len(out)
+    j = frame % numleds
+    out[:numleds - j] = source[j:]
+    out[numleds - j:] = source[:j]
+
+
+@register
+class SparklingStar(Effect):
+
+    # A new star every two frames, dimmed on the second one.
+
+    name = "SPARKLING_STAR"
+
+    def __init__(self, client):
+        Effect.__init__(self, client)
+        self._star = None
+        self._pixel = 0
+
+    def render(self, frame, out):
+        # The strip may have shrunk since the star was placed.
+        if frame // 2 != self._star or self._pixel >= len(out):
+            self._star = frame // 2
+            self._pixel = random.randrange(len(out))
+        out[:] = (10, 10, 10)
+        out[self._pixel] = (255, 255, 255) if frame % 2 == 0 else (180, 180, 180)
+
+
+@register
+class RunningRainbow(Effect):
+
+    # One wheel gather per strip size, then a rotation per frame.
+
+    name = "RUNNING_RAINBOW"
+
+    def __init__(self, client):
+        Effect.__init__(self, client)
+        self._rainbow = None
+
+    def period(self):
+        return self.client.numPixels()
+
+    def render(self, frame, out):
+        numleds = len(out)
+        if self._rainbow is None or len(self._rainbow) != numleds:
+            self._rainbow = self.client.wheelColors(np.arange(numleds) * (256 / numleds))
+        _rotate(out, frame, self._rainbow)
+
+
+@register
+class ColorFade(Effect):
+
+    name = "COLOR_FADE"
+
+    def period(self):
+        return 256
+
+    def render(self, frame, out):
+        out[:] = wheelPalette()[frame % 256]
+
+
+@register
+class GradientScroll(Effect):
+
+    name = "GRADIENT_SCROLL"
+
+    def period(self):
+        return self.client.numPixels()
+
+    def params(self):
+        return self.client.gradient
+
+    def render(self, frame, out):
+        _rotate(out, frame, renderGradient(*self.client.gradient, len(out)))
+
+
+@register
+class GradientSparkle(Effect):
+
+    # Fading white sparkles added over the current gradient.
+
+    name = "GRADIENT_SPARKLE"
+
+    def __init__(self, client):
+        Effect.__init__(self, client)
+        self._compositor = None
+
+    def render(self, frame, out):
+        numleds = len(out)
+        if self._compositor is None or self._compositor.leds != numleds:
+            self._compositor = Compositor(numleds)
+            self._base = self._compositor.addLayer("gradient")
+            self._sparkle = self._compositor.addLayer("sparkle", "add")
+            self._sparkle.fill((255, 255, 255), 0.0)
+        self._base.write(renderGradient(*self.client.gradient, numleds), 1.0)
+        self._sparkle.alpha[:] *= 0.85
+        self._sparkle.alpha[random.randrange(numleds)] = 1.0
+        self._compositor.flatten(out)
@@ -0,0 +1,206 @@
+"""
+Name: ReceiverEmulator
+Description: Python stand-in for the Esp8226_ColorPicker firmware. Binds a UDP
+port, decodes the packets produced by NeoPy.show() (raw or compressed, see
+encoding.py) and reassembles them into frames, recording latency, loss and
+reordering. Loss, delay and jitter can be
+simulated to approximate a busy Wi-Fi link.
+"""
+
+
+import heapq
+import random
+import socket
+import time
+from threading import Thread, Condition
+
+import numpy as np
+
+import encoding
+
+
+class Frame():
+
+    def __init__(self, number, expected, first, kind=0):
+        self.number = number
+        self.kind = kind
+        self.expected = expected
+        self.first = first
+        self.last = first
+        self.received = set()
+        self.reordered = 0
+
+    @property
+    def complete(self):
+        return len(self.received) == self.expected
+
+    @property
+    def missing(self):
+        return self.expected - len(self.received)
+
+    @property
+    def spread(self):
+        # Time between the first and last packet of the frame arriving.
+        return self.last - self.first
+
+
+class ReceiverEmulator():
+
+    def __init__(self, leds, ledsPerPacket=128, ip="127.0.0.1", port=0,
+                 loss=0.0, delay=0.0, jitter=0.0, seed=None, clock=time.perf_counter):
+        self.leds = leds
+        self.ledsPerPacket = ledsPerPacket
+        self.strip = np.zeros((leds, 3), dtype=np.uint8)
+        self.loss = loss
+        self.delay = delay
+        self.jitter = jitter
+        self.clock = clock
+        self.expected = max(1, -(-leds // ledsPerPacket))
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind((ip, port))
+        self.ip, self.port = self.sock.getsockname()
+
+        self._random = random.Random(seed)
+        self._pending = []
+        self._sequence = 0
+        self._current = None
+        self._frameNumber = 0
+        self._condition = Condition()
+        self._running = False
+        self._thread = None
+        self.reset()
+
+    def reset(self):
+        with self._condition:
+            self.frames = []
+            self.packets = 0
+            self.bytes = 0
+            self.dropped = 0
+            self.malformed = 0
+            self.shows = 0
+            self._current = None
+
+    def start(self):
+        self._running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._condition:
+            self._closeFrame()
+        self.sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        buffer = bytearray(65536)
+        while self._running:
+            # Wake up in time for the next delayed packet.
+            wait = 0.005
+            if self._pending:
+                wait = min(wait, max(0.0001, self._pending[0][0] - self.clock()))
+            self.sock.settimeout(wait)
+            try:
+                size, _ = self.sock.recvfrom_into(buffer)
+            except socket.timeout:
+                size = 0
+            except OSError:
+                break
+
+            now = self.clock()
+            if size:
+                if self.loss and self._random.random() < self.loss:
+                    self.dropped += 1
+                else:
+                    due = now + self.delay + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+                    self._sequence += 1
+                    heapq.heappush(self._pending, (due, self._sequence, bytes(buffer[:size])))
+
+            while self._pending and self._pending[0][0] <= now:
+                _, _, packet = heapq.heappop(self._pending)
+                self.receive(packet, self.clock())
+
+    def receive(self, packet, now=None):
+        # The firmware's loop(): decode one datagram into the strip and display
+        # it. Raw, RLE and palette packets are handled by encoding.decode().
+        if now is None:
+            now = self.clock()
+
+        with self._condition:
+            # Like the firmware, take the raw packet stride from packet 0,
+            # which is never shorter than the others.
+            if len(packet) > 1 and packet[0] == 0:
+                self.ledsPerPacket = (len(packet) - 1) // 3
+                self.expected = max(1, -(-self.leds // self.ledsPerPacket))
+            decoded = encoding.decode(packet, self.strip, self.ledsPerPacket)
+            if decoded is None:
+                self.malformed += 1
+                return
+            kind, packetNo, count = decoded
+            self.packets += 1
+            self.bytes += len(packet)
+            self.shows += 1
+
+            # A repeated packet number, or a switch between raw and encoded
+            # packets, can only belong to the next frame.
+            frame = self._current
+            if frame is None or frame.kind != kind or packetNo in frame.received:
+                self._closeFrame()
+                expected = self.expected if kind == 0 else count
+                frame = self._current = Frame(self._frameNumber, expected, now, kind)
+                self._frameNumber += 1
+            elif packetNo < max(frame.received):
+                frame.reordered += 1
+            frame.received.add(packetNo)
+            frame.last = now
+            if frame.complete:
+                self._closeFrame()
+
+    def _closeFrame(self):
+        if self._current is not None:
+            self.frames.append(self._current)
+            self._current = None
+            self._condition.notify_all()
+
+    def waitFrames(self, count, timeout=1.0):
+        # Blocks until at least `count` frames were closed; returns the frames.
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while len(self.frames) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return list(self.frames)
+
+    def stats(self):
+        with self._condition:
+            frames = list(self.frames)
+        complete = [f for f in frames if f.complete]
+        spreads = np.array([f.spread for f in complete]) if complete else np.zeros(1)
+        expected = sum(f.expected for f in frames)
+        return {
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "frames": len(frames),
+            "complete_frames": len(complete),
+            "partial_frames": len(frames) - len(complete),
+            "missing_packets": sum(f.missing for f in frames),
+            "packet_loss": sum(f.missing for f in frames) / expected if expected else 0.0,
+            "reordered": sum(f.reordered for f in frames),
+            "simulated_drops": self.dropped,
+            "malformed": self.malformed,
+            "spread_mean": float(spreads.mean()),
+            "spread_p95": float(np.percentile(spreads, 95)),
+        }
@@ -0,0 +1,181 @@
+"""
+Compact wire encodings for NeoPy frames, decoded by Esp8226_ColorPicker.ino
+and emulator.ReceiverEmulator.
+
+Raw packet:      [packetNo] then r, g, b for the leds from packetNo * ledsPerPacket.
+                 packetNo stays below FIRST_ENCODED_TYPE. Packet 0 is never
+                 shorter than the others, so receivers take ledsPerPacket from it.
+RLE packet:      [RLE][index][count][start hi][start lo]
+                 then repeated [run length][r][g][b] from led `start` on.
+Palette packet:  [PALETTE][index][count][start hi][start lo][leds hi][leds lo]
+                 [palette size] [palette size * r, g, b] then one 4-bit palette
+                 index per led, high nibble first.
+
+`index` and `count` number the packets of one encoded frame so a receiver can
+detect loss; `start` is relative to the receiver's first led.
+"""
+
+import numpy as np
+
+
+FIRST_ENCODED_TYPE = 0xF0
+RLE = 0xF1
+PALETTE = 0xF2
+
+RLE_HEADER = 5
+PALETTE_HEADER = 8
+MAX_RUN = 255
+MAX_PALETTE = 16
+
+
+def _pack(frame):
+    return (frame[:, 0].astype(np.uint32) << 16) | (frame[:, 1].astype(np.uint32) << 8) | frame[:, 2]
+
+
+def _runs(packed):
+    # (first led, length) of every run of equal colors.
+    starts = np.flatnonzero(packed[1:] != packed[:-1]) + 1
+    starts = np.concatenate(([0], starts))
+    lengths = np.diff(np.concatenate((starts, [len(packed)])))
+    return starts, lengths
+
+
+def encodeRle(frame, starts, lengths, maxPacket):
+    # Runs longer than MAX_RUN are split into several records.
+    pieces = (lengths + MAX_RUN - 1) // MAX_RUN
+    run = np.repeat(np.arange(len(lengths)), pieces)
+    pieceLengths = np.full(len(run), MAX_RUN, dtype=np.int64)
+    last = np.cumsum(pieces) - 1
+    pieceLengths[last] = lengths - MAX_RUN * (pieces - 1)
+
+    records = np.empty((len(run), 4), dtype=np.uint8)
+    records[:, 0] = pieceLengths
+    records[:, 1:] = frame[starts[run]]
+    firstLed = np.concatenate(([0], np.cumsum(pieceLengths)))
+
+    perPacket = (maxPacket - RLE_HEADER) // 4
+    if perPacket < 1:
+        return None
+    count = -(-len(records) // perPacket)
+    if count > 255:
+        return None
+    packets = []
+    for index in range(count):
+        a = index * perPacket
+        b = min(a + perPacket, len(records))
+        start = int(firstLed[a])
+        header = bytes((RLE, index, count, start >> 8, start & 0xFF))
+        packets.append(header + records[a:b].tobytes())
+    return packets
+
+
+def encodePalette(palette, inverse, maxPacket):
+    numleds = len(inverse)
+    colors = palette.tobytes()
+    perPacket = 2 * (maxPacket - PALETTE_HEADER - len(colors))
+    if perPacket < 1:
+        return None
+    count = -(-numleds // perPacket)
+    if count > 255:
+        return None
+    packets = []
+    for index in range(count):
+        start = index * perPacket
+        chunk = inverse[start:start + perPacket].astype(np.uint8)
+        if len(chunk) % 2:
+            chunk = np.append(chunk, np.uint8(0))
+        nibbles = (chunk[0::2] << 4) | chunk[1::2]
+        leds = min(perPacket, numleds - start)
+        header = bytes((PALETTE, index, count, start >> 8, start & 0xFF,
+                        leds >> 8, leds & 0xFF, len(palette)))
+        packets.append(header + colors + nibbles.tobytes())
+    return packets
+
+
+def compress(frame, ledsPerPacket, maxPacket):
+    # Picks the smallest encoding for one receiver's (N, 3) output frame.
+    # Returns the packets to send, or None when raw packets are smallest or
+    # maxPacket is too small to hold an encoded record.
+    numleds = len(frame)
+    if numleds == 0 or numleds > 0xFFFF:
+        return None
+    raw = 3 * numleds + -(-numleds // ledsPerPacket)
+
+    packed = _pack(frame)
+    starts, lengths = _runs(packed)
+    rle = 4 * int(np.sum((lengths + MAX_RUN - 1) // MAX_RUN))
+    best, size = None, raw
+
+    if rle + RLE_HEADER < size and maxPacket - RLE_HEADER >= 4:
+        best, size = RLE, rle + RLE_HEADER
+
+    # A palette frame costs about half a byte per led, so it can only beat
+    # RLE when the runs are short; skip the sort otherwise.
+    if 4 * len(starts) > numleds // 2:
+        unique, inverse = np.unique(packed, return_inverse=True)
+        fits = maxPacket - PALETTE_HEADER - 3 * len(unique) >= 1
+        if len(unique) <= MAX_PALETTE and fits:
+            paletteSize = PALETTE_HEADER + 3 * len(unique) + (numleds + 1) // 2
+            if paletteSize < size:
+                palette = np.empty((len(unique), 3), dtype=np.uint8)
+                palette[:, 0] = unique >> 16
+                palette[:, 1] = (unique >> 8) & 0xFF
+                palette[:, 2] = unique & 0xFF
+                packets = encodePalette(palette, inverse.reshape(-1), maxPacket)
+                if packets:
+                    return packets
+
+    if best == RLE:
+        return encodeRle(frame, starts, lengths, maxPacket) or None
+    return None
+
+
+def decode(packet, strip, ledsPerPacket):
+    # Reference decoder: writes one packet into the (N, 3) strip array. Returns
+    # (type, index, count), with type 0 for raw packets, or None if malformed.
+    numleds = len(strip)
+    if len(packet) < 1:
+        return None
+    kind = packet[0]
+
+    if kind < FIRST_ENCODED_TYPE:
+        if (len(packet) - 1) % 3:
+            return None
+        start = kind * ledsPerPacket
+        leds = min((len(packet) - 1) // 3, numleds - start)
+        if leds <= 0:
+            return None
+        strip[start:start + leds] = np.frombuffer(packet, dtype=np.uint8, count=3 * leds, offset=1).reshape(leds, 3)
+        return 0, kind, None
+
+    if kind == RLE:
+        if len(packet) < RLE_HEADER or (len(packet) - RLE_HEADER) % 4:
+            return None
+        start = (packet[3] << 8) | packet[4]
+        records = np.frombuffer(packet, dtype=np.uint8, offset=RLE_HEADER).reshape(-1, 4)
+        colors = np.repeat(records[:, 1:], records[:, 0], axis=0)
+        leds = max(0, min(len(colors), numleds - start))
+        strip[start:start + leds] = colors[:leds]
+        return RLE, packet[1], packet[2]
+
+    if kind == PALETTE:
+        if len(packet) < PALETTE_HEADER:
+            return None
+        start = (packet[3] << 8) | packet[4]
+        leds = (packet[5] << 8) | packet[6]
+        size = packet[7]
+        colorsEnd = PALETTE_HEADER + 3 * size
+        if len(packet) < colorsEnd + (leds + 1) // 2:
+            return None
+        palette = np.frombuffer(packet, dtype=np.uint8, count=3 * size, offset=PALETTE_HEADER).reshape(size, 3)
+        nibbles = np.frombuffer(packet, dtype=np.uint8, count=(leds + 1) // 2, offset=colorsEnd)
+        index = np.empty(2 * len(nibbles), dtype=np.uint8)
+        index[0::2] = nibbles >> 4
+        index[1::2] = nibbles & 0x0F
+        if len(index[:leds]) and index[:leds].max() >= size:
+            return None
+        leds = max(0, min(leds, numleds - start))
+        strip[start:start + leds] = palette[index[:leds]]
+        return PALETTE, packet[1], packet[2]
+
+    return None
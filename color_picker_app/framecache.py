@@ -0,0 +1,45 @@
+from collections import OrderedDict
+
+
+class FrameCache():
+
+    def __init__(self, maxBytes=64 * 1024 * 1024):
+        self.maxBytes = maxBytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def canHold(self, nbytes):
+        return nbytes <= self.maxBytes
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, frame, encoded):
+        # Stores a rendered (N, 3) frame with its encoded packets, evicting the
+        # least recently used entries to stay under maxBytes.
+        size = frame.nbytes + len(encoded)
+        if size > self.maxBytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old[0].nbytes + len(old[1])
+        while self.size + size > self.maxBytes:
+            _, (oldFrame, oldEncoded) = self._entries.popitem(last=False)
+            self.size -= oldFrame.nbytes + len(oldEncoded)
+        self._entries[key] = (frame, encoded)
+        self.size += size
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
@@ -0,0 +1,33 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+DEFAULT_GRADIENT = ((0.0, 1.0), ((0, 0, 0), (255, 255, 255)))
+
+
+def gradientKey(points, colors):
+    # Hashable, sorted form of a gradient, used as the render cache key.
+    stops = sorted(zip((float(p) for p in points), (tuple(int(c) for c in color) for color in colors)))
+    return tuple(p for p, _ in stops), tuple(c for _, c in stops)
+
+
+def renderGradient(points, colors, leds):
+    # Per-led colors of the gradient as a read-only (leds, 3) uint8 array.
+    # `points` are stop positions in 0..1 and `colors` their (r, g, b).
+    points, colors = gradientKey(points, colors)
+    return _render(points, colors, leds)
+
+
+@lru_cache(maxsize=32)
+def _render(points, colors, leds):
+    x = np.linspace(0.0, 1.0, leds) if leds > 1 else np.zeros(leds)
+    stops = np.array(colors, dtype=np.float64).reshape(-1, 3)
+    frame = np.empty((leds, 3), dtype=np.uint8)
+    if len(points) == 0:
+        frame[:] = 0
+    else:
+        for channel in range(3):
+            frame[:, channel] = np.rint(np.interp(x, points, stops[:, channel]))
+    frame.setflags(write=False)
+    return frame
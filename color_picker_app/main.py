@@ -1,3 +1,4 @@
+import multiprocessing
 from threading import Thread
 from PySide6.QtGui import QScreen, QIcon, QRegularExpressionValidator, QPixmap
 from PySide6.QtCore import Qt, Signal, QThread, QRegularExpression, QRunnable, Slot
@@ -16,13 +17,19 @@ from PySide6.QtWidgets import (
     QLabel,
     QComboBox,
     QDoubleSpinBox,
-    QAbstractSpinBox
+    QAbstractSpinBox,
+    QFileDialog
 )
 
 from functools import partial
 import pyqtgraph as pg
 from qgradientpicker import QGradientPicker, ColorType
 from client import Client, Animations
+import effects
+from transport import AsyncioTransport
+from coalescer import CoalescingSender
+from renderproc import RenderProcess
+from audio import AudioEngine, PyAudioSource, WavSource, SyntheticSource
 import qdarktheme
 import config
 
@@ -57,6 +64,10 @@ class MainWindow(QMainWindow):
         qtRect.moveCenter(centerPoint)
         self.move(qtRect.topLeft())
 
+    def closeEvent(self, event):
+        self.centralWidget().shutdown()
+        super().closeEvent(event)
+
     def createStatusBar(self):
         statusBar = QStatusBar()
         statusBar.showMessage("Status:  |")
@@ -65,6 +76,9 @@ class MainWindow(QMainWindow):
 
 class TableWidget(QWidget):
 
+    # Emitted from the sender thread; Qt delivers it on the GUI thread.
+    sendFailed = Signal(str)
+
     def __init__(self, parent):
         super().__init__(parent)
 
@@ -75,6 +89,8 @@ class TableWidget(QWidget):
         # External windows.
         self.gradientPickerDialog = QGradientPicker(self)
         self.colorPickerDialog = QColorDialog(self)
+        self.colorPickerDialog.currentColorChanged.connect(partial(self.callback, "color_changed"))
+        self.gradientPickerDialog.gradSlider.gradientChanged.connect(partial(self.callback, "gradient_changed"))
 
         # Global vars.
         self.staticColor = (0, 0, 0)
@@ -86,6 +102,9 @@ class TableWidget(QWidget):
         self._udpPort = _config.get("settings", "default_udp_port")
         self._ledCount = _config.getint("settings", "default_leds_count")
         self._ledBrightness = _config.getint("settings", "default_leds_brightness")
+        self._isolatedRenderer = _config.getboolean("settings", "isolated_renderer")
+        self._fadeDuration = _config.getfloat("settings", "fade_duration")
+        self._maxSendRate = _config.getfloat("settings", "max_send_rate")
 
         self.udpIp = self._udpIp
         self.udpPort = self._udpPort
@@ -94,6 +113,19 @@ class TableWidget(QWidget):
 
         # Init client.
         self._client = Client(self.ledCount, self.ledBrightness, self.udpIp, self.udpPort)
+        self._client.setTransport(AsyncioTransport())
+
+        # Interactive updates go through a latest-wins sender, so dragging a
+        # color or gradient stop never sends more than max_send_rate frames/s.
+        self._sender = CoalescingSender(self._maxSendRate, onError=lambda e: self.sendFailed.emit(str(e)))
+        self.sendFailed.connect(self.showSendError)
+
+        # Optional animation renderer in its own process.
+        self._renderer = None
+        self.createRenderer()
+
+        # Audio reactive engine, running while the music tab is started.
+        self._audio = None
 
         self.initUI()
 
@@ -144,13 +176,23 @@ class TableWidget(QWidget):
         self.colorLabel = QLabel("")
         self.gradLabel = QLabel("")
 
+        # Init input.
+        self.fadeInput = QDoubleSpinBox()
+        self.fadeInput.setDecimals(1)
+        self.fadeInput.setRange(0, 5)
+        self.fadeInput.setSingleStep(0.1)
+        self.fadeInput.setValue(self._fadeDuration)
+        self.fadeInput.setSuffix(" s")
+        self.fadeInput.setToolTip("Fade Duration")
+
         # Create control tab.
         self.controlTab.layout = QGridLayout()
         self.controlTab.layout.addWidget(colorBtn, 0, 0)
         self.controlTab.layout.addWidget(self.colorLabel, 0, 1)
         self.controlTab.layout.addWidget(gradBtn, 1, 0)
         self.controlTab.layout.addWidget(self.gradLabel, 1, 1)
-        self.controlTab.layout.addWidget(offBtn, 2, 0, 1, 2)
+        self.controlTab.layout.addWidget(offBtn, 2, 0)
+        self.controlTab.layout.addWidget(self.fadeInput, 2, 1)
         self.controlTab.setLayout(self.controlTab.layout)
 
     def createSettingsTab(self):
@@ -216,7 +258,45 @@ class TableWidget(QWidget):
         self.settingsTab.setLayout(self.settingsTab.layout)
 
     def createMusicTab(self):
-        pass
+
+        # Init label.
+        inputLabel = QLabel("Input")
+
+        # Init combobox.
+        self.audioInputBox = QComboBox()
+        self.audioInputBox.addItems(["Input Device", "WAV File", "Test Tone"])
+
+        # Init input.
+        self.audioBandsInput = QSpinBox()
+        self.audioBandsInput.setRange(4, 64)
+        self.audioBandsInput.setValue(16)
+        self.audioBandsInput.setSuffix(" bands")
+
+        # Init buttons.
+        self.startMusicBtn = QPushButton("Start")
+        self.stopMusicBtn = QPushButton("Stop")
+        self.stopMusicBtn.setEnabled(False)
+
+        # Button signals.
+        self.startMusicBtn.clicked.connect(partial(self.callback, "music_start"))
+        self.stopMusicBtn.clicked.connect(partial(self.callback, "music_stop"))
+
+        self.musicTab.layout = QGridLayout()
+        self.musicTab.layout.addWidget(inputLabel, 0, 0)
+        self.musicTab.layout.addWidget(self.audioInputBox, 0, 1)
+        self.musicTab.layout.addWidget(self.audioBandsInput, 0, 2)
+        self.musicTab.layout.addWidget(self.startMusicBtn, 1, 0)
+        self.musicTab.layout.addWidget(self.stopMusicBtn, 1, 1)
+        self.musicTab.setLayout(self.musicTab.layout)
+
+    def createAudioSource(self):
+        source = self.audioInputBox.currentText()
+        if source == "WAV File":
+            path, _ = QFileDialog.getOpenFileName(self, "Open WAV File", "", "WAV Files (*.wav)")
+            return WavSource(path, loop=True, realtime=True) if path else None
+        elif source == "Test Tone":
+            return SyntheticSource(realtime=True)
+        return PyAudioSource()
 
     def createAnimationTab(self):
 
@@ -225,7 +305,7 @@ class TableWidget(QWidget):
 
         # Init combobox.
         self.animationBox = QComboBox()
-        self.animationBox.addItems([_.name for _ in Animations])
+        self.animationBox.addItems(effects.names())
 
         #Init input.
         self.animationDelayInput = QDoubleSpinBox()
@@ -233,7 +313,8 @@ class TableWidget(QWidget):
         self.animationDelayInput.setDecimals(2)
         self.animationDelayInput.setRange(0.01, 1)
         self.animationDelayInput.setValue(0.04)
-        self.animationDelayInput.setToolTip("Animation Delay") 
+        self.animationDelayInput.setSuffix(" s")
+        self.animationDelayInput.setToolTip("Frame Period") 
 
         # Init buttons.
         self.startAnimationBtn = QPushButton("Start")
@@ -252,6 +333,35 @@ class TableWidget(QWidget):
         self.animationTab.layout.addWidget(self.stopAnimationBtn, 1, 1)
         self.animationTab.setLayout(self.animationTab.layout)
 
+    def createRenderer(self):
+        if self._renderer is not None:
+            self._renderer.shutdown()
+            self._renderer = None
+        if self._isolatedRenderer:
+            self._renderer = RenderProcess(self.ledCount, self.ledBrightness, self.udpIp, self.udpPort)
+
+    def animator(self):
+        return self._renderer if self._renderer is not None else self._client
+
+    def shutdown(self):
+        self._sender.close()
+        self._client.stopAnimation()
+        if self._audio is not None:
+            self._audio.stop()
+            self._audio = None
+        if self._renderer is not None:
+            self._renderer.shutdown()
+            self._renderer = None
+        # Detach first, so a late frame goes to the socket rather than a
+        # closed loop.
+        transport = self._client.transport
+        self._client.setTransport(None)
+        transport.close()
+
+    @Slot(str)
+    def showSendError(self, message):
+        self.window().statusBar().showMessage("Status:  | %s" % message)
+
     def updateColorLabel(self):
         self.colorLabel.setStyleSheet(
             "border: 1px solid #2a2a49;"
@@ -284,34 +394,90 @@ class TableWidget(QWidget):
         elif param == "show_gradient_dialog":
             self.openGradientDialog()
 
+        elif param == "color_changed":
+            # Live preview while the dialog is open.
+            color = self.colorPickerDialog.currentColor().getRgb()[:-1]
+            self._sender.post(self.animator().setColor, color)
+
         elif param == "color_accepted":
             self.staticColorHex = self.colorPickerDialog.selectedColor().name()
             self.staticColor = self.colorPickerDialog.selectedColor().getRgb()[:-1]
-            self._client.setColor(self.staticColor)
+            self._sender.post(self.animator().setColor, self.staticColor, self.fadeInput.value())
             self.updateColorLabel()
 
+        elif param == "gradient_changed":
+            # Fires on every mouse move while a stop is dragged.
+            colors = self.gradientPickerDialog.getGradient(mode=ColorType.RGB)
+            points = self.gradientPickerDialog.getGradient(mode=ColorType.GRADIENT_POINTS)
+            self._sender.post(self.animator().setGradient, colors, points)
+
         elif param == "gradient_accepted":
             self.gradientPoints = self.gradientPickerDialog.getGradient(mode=ColorType.GRADIENT_POINTS)
             self.gradientColors = self.gradientPickerDialog.getGradient(mode=ColorType.RGB)
+            self._sender.post(self.animator().setGradient, self.gradientColors, self.gradientPoints,
+                              self.fadeInput.value())
             self.updateGradientLabel()
 
         elif param == "lights_off":
-            self._client.setColor((0, 0, 0))
+            self._sender.post(self.animator().setColor, (0, 0, 0), self.fadeInput.value())
 
         elif param == "animation_start":
             animation = self.animationBox.currentText()
             delay = self.animationDelayInput.value()
 
-            self._client.startAnimation(Animations.from_str(animation), delay)
+            self._sender.flush()
+            self.animator().startAnimation(Animations.from_str(animation), delay, self.fadeInput.value())
             self.startAnimationBtn.setEnabled(False)
             self.stopAnimationBtn.setEnabled(True)
             self.controlTab.setEnabled(False)
+            self.musicTab.setEnabled(False)
 
         elif param == "animation_stop":
-            self._client.stopAnimation()
+            self.animator().stopAnimation(self.fadeInput.value())
+            stats = self.animator().animationStats()
+            if stats:
+                self.window().statusBar().showMessage(
+                    "Status:  | %.1f fps, %.1f ms jitter, %d skipped" % (
+                        stats["fps"], stats["jitter"] * 1000, stats["skipped"]))
             self.startAnimationBtn.setEnabled(True)
             self.stopAnimationBtn.setEnabled(False)
             self.controlTab.setEnabled(True)
+            self.musicTab.setEnabled(True)
+
+        elif param == "music_start":
+            self._sender.flush()
+            try:
+                source = self.createAudioSource()
+            except (RuntimeError, OSError, ValueError) as e:
+                self.window().statusBar().showMessage("Status:  | %s" % e)
+                return
+            if source is None:
+                return
+
+            # The engine drives this process's client, so end anything the
+            # animator is still playing (a fade-out or color fade) first; the
+            # tabs that could start something else stay disabled meanwhile.
+            self.animator().stopAnimation()
+            self._audio = AudioEngine(self._client, source, self.audioBandsInput.value())
+            self._audio.start()
+            self.startMusicBtn.setEnabled(False)
+            self.stopMusicBtn.setEnabled(True)
+            self.controlTab.setEnabled(False)
+            self.animationTab.setEnabled(False)
+            self.settingsTab.setEnabled(False)
+
+        elif param == "music_stop":
+            self._audio.stop()
+            stats = self._audio.stats()
+            self._audio = None
+            self.window().statusBar().showMessage(
+                "Status:  | %.1f ms latency, %.2f ms processing" % (
+                    stats["latency_ms"], stats["processing_mean_ms"]))
+            self.startMusicBtn.setEnabled(True)
+            self.stopMusicBtn.setEnabled(False)
+            self.controlTab.setEnabled(True)
+            self.animationTab.setEnabled(True)
+            self.settingsTab.setEnabled(True)
 
         elif param == "settings_apply":
             self.udpIp = self.ipInput.text()
@@ -319,8 +485,9 @@ class TableWidget(QWidget):
             self.ledCount = self.ledsInput.value()
             self.ledBrightness = self.brightnessInput.value()
 
-            print(self._client.is_socket_closed(), self.udpIp)
+            self._sender.flush()
             self._client.setStrip(self.ledCount, self.ledBrightness, self.udpIp, self.udpPort)
+            self.createRenderer()
 
         elif param == "settings_reset":
             self.udpIp = self._udpIp
@@ -349,6 +516,8 @@ class AudioSpectrum(pg.GraphicsLayoutWidget):
 
 
 if __name__ == "__main__":
+    # Lets the frozen (PyInstaller) exe start render process children.
+    multiprocessing.freeze_support()
     app = QApplication([])
     window = MainWindow()
     window.show()
@@ -0,0 +1,218 @@
+import ctypes
+import ctypes.util
+import os
+import socket
+import sys
+
+from client import Client
+from neopy import checkPayloadBudget
+
+
+class _Iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _Msghdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_Iovec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _Mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _Msghdr), ("msg_len", ctypes.c_uint)]
+
+
+class _SockaddrIn(ctypes.Structure):
+    _fields_ = [
+        ("sin_family", ctypes.c_ushort),
+        ("sin_port", ctypes.c_uint16),
+        ("sin_addr", ctypes.c_uint8 * 4),
+        ("sin_zero", ctypes.c_uint8 * 8),
+    ]
+
+
+def _loadSendmmsg():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+_sendmmsg = _loadSendmmsg()
+
+
+class Endpoint():
+
+    def __init__(self, ip, port, offset, length, payloadBudget=None):
+        self.ip = ip
+        self.port = int(port)
+        self.offset = offset
+        self.length = length
+        self.payloadBudget = checkPayloadBudget(payloadBudget)
+        self.packets = 0
+        self.bytes = 0
+        self.errors = 0
+
+    def stats(self):
+        return {
+            "ip": self.ip,
+            "port": self.port,
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "errors": self.errors,
+        }
+
+
+class MultiClient(Client):
+
+    # One logical framebuffer split across several receivers. Each Endpoint
+    # maps the leds [offset, offset + length) to its own strip, and every frame
+    # is sent to all of them in one batched pass on a single socket, with
+    # sendmmsg() where the platform has it.
+
+    def __init__(self, endpoints, brightness=100, skipUnchanged=False):
+        self.endpoints = list(endpoints)
+        leds = max([e.offset + e.length for e in self.endpoints] or [0])
+        first = self.endpoints[0] if self.endpoints else Endpoint("127.0.0.1", 4242, 0, 0)
+        Client.__init__(self, leds, brightness, first.ip, first.port, skipUnchanged)
+
+    def setEndpoints(self, endpoints):
+        self.endpoints = list(endpoints)
+        leds = max([e.offset + e.length for e in self.endpoints] or [0])
+        self.setStrip(leds, self.brightness, self.ip, self.port)
+
+    def endpointStats(self):
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+    def _segments(self):
+        return [((e.ip, e.port), e.offset, e.length, e.payloadBudget or self.payloadBudget)
+                for e in self.endpoints]
+
+    def _allocPackets(self):
+        Client._allocPackets(self)
+        self._segmentEndpoints = {((e.ip, e.port), e.offset): e for e in self.endpoints}
+        self._slotEndpoints = {}
+        for slot in self._packets:
+            start, offset, packet, payload, addr = slot
+            for e in self.endpoints:
+                if (e.ip, e.port) == addr and e.offset <= start < e.offset + e.length:
+                    self._slotEndpoints[offset] = e
+                    break
+
+        count = len(self._packets)
+        if _sendmmsg is None or count == 0:
+            return
+
+        # Prebuilt message headers pointing straight into the packet buffer,
+        # which can't be reallocated while the memoryviews exist.
+        self._packetArray = (ctypes.c_char * len(self._packetBuffer)).from_buffer(self._packetBuffer)
+        base = ctypes.addressof(self._packetArray)
+        self._sockaddrs = {}
+        for e in self.endpoints:
+            if (e.ip, e.port) not in self._sockaddrs:
+                sa = _SockaddrIn()
+                sa.sin_family = socket.AF_INET
+                sa.sin_port = socket.htons(e.port)
+                sa.sin_addr[:] = socket.inet_aton(socket.gethostbyname(e.ip))
+                self._sockaddrs[(e.ip, e.port)] = sa
+        self._iovecs = (_Iovec * count)()
+        self._msgs = (_Mmsghdr * count)()
+        self._batch = (_Mmsghdr * count)()
+        self._slotMsg = {}
+        for i, (start, offset, packet, payload, addr) in enumerate(self._packets):
+            self._iovecs[i].iov_base = base + offset
+            self._iovecs[i].iov_len = len(packet)
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self._sockaddrs[addr])
+            hdr.msg_namelen = ctypes.sizeof(_SockaddrIn)
+            hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            hdr.msg_iovlen = 1
+            self._slotMsg[offset] = i
+
+    def _sendPackets(self, slots):
+        if _sendmmsg is None or self.transport is not None or not slots:
+            for slot in slots:
+                try:
+                    Client._sendPackets(self, (slot,))
+                except OSError:
+                    self._slotEndpoints[slot[1]].errors += 1
+                    raise
+                self._count(slot)
+            return
+
+        for i, slot in enumerate(slots):
+            self._batch[i] = self._msgs[self._slotMsg[slot[1]]]
+        done = 0
+        while done < len(slots):
+            sent = _sendmmsg(self.sock.fileno(), ctypes.addressof(self._batch) + done * ctypes.sizeof(_Mmsghdr),
+                             len(slots) - done, 0)
+            if sent < 0:
+                self._slotEndpoints[slots[done][1]].errors += 1
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            for slot in slots[done:done + sent]:
+                start, offset, packet, payload, addr = slot
+                self._sent[start:start + len(payload)] = self.strip[start:start + len(payload)]
+                self._count(slot)
+            done += sent
+
+    def _sendEncoded(self, segments):
+        # Compressed packets are built per frame, so their message headers are
+        # too; they go out in one sendmmsg() batch like raw packets.
+        messages = []
+        for addr, first, packets in segments:
+            endpoint = self._segmentEndpoints[(addr, first)]
+            messages.extend((packet, addr, endpoint) for packet in packets)
+
+        if _sendmmsg is None or self.transport is not None:
+            for packet, addr, endpoint in messages:
+                try:
+                    self._send(packet, addr)
+                except OSError:
+                    endpoint.errors += 1
+                    raise
+                endpoint.packets += 1
+                endpoint.bytes += len(packet)
+            return
+
+        count = len(messages)
+        buffers = [ctypes.create_string_buffer(packet, len(packet)) for packet, _, _ in messages]
+        iovecs = (_Iovec * count)()
+        batch = (_Mmsghdr * count)()
+        for i, (packet, addr, endpoint) in enumerate(messages):
+            iovecs[i].iov_base = ctypes.addressof(buffers[i])
+            iovecs[i].iov_len = len(packet)
+            hdr = batch[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self._sockaddrs[addr])
+            hdr.msg_namelen = ctypes.sizeof(_SockaddrIn)
+            hdr.msg_iov = ctypes.pointer(iovecs[i])
+            hdr.msg_iovlen = 1
+        done = 0
+        while done < count:
+            sent = _sendmmsg(self.sock.fileno(), ctypes.addressof(batch) + done * ctypes.sizeof(_Mmsghdr),
+                             count - done, 0)
+            if sent < 0:
+                messages[done][2].errors += 1
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            for packet, addr, endpoint in messages[done:done + sent]:
+                endpoint.packets += 1
+                endpoint.bytes += len(packet)
+            done += sent
+
+    def _count(self, slot):
+        endpoint = self._slotEndpoints[slot[1]]
+        endpoint.packets += 1
+        endpoint.bytes += len(slot[2])
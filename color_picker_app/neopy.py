@@ -10,16 +10,81 @@ Date: 14-01-2019
 import socket
 import time
 import random
-import math
+from functools import lru_cache
+
+import numpy as np
+
+import encoding
+
+
+# Largest UDP payload that fits a 1500-byte Ethernet MTU without IP
+# fragmentation, and the firmware's packet buffer (BUFFER_LEN in the sketch).
+MAX_UDP_PAYLOAD = 1472
+RECEIVER_BUFFER_LEN = 1024
+
+
+def checkPayloadBudget(budget, receiverBuffer=RECEIVER_BUFFER_LEN):
+    if budget is None:
+        return None
+    budget = int(budget)
+    if budget < 4:
+        raise ValueError("payload budget of %d bytes can't hold a single led" % budget)
+    if budget > MAX_UDP_PAYLOAD:
+        raise ValueError("payload budget of %d bytes exceeds the %d byte MTU payload"
+                         % (budget, MAX_UDP_PAYLOAD))
+    if budget > receiverBuffer:
+        raise ValueError("payload budget of %d bytes exceeds the %d byte receiver buffer"
+                         % (budget, receiverBuffer))
+    return budget
+
+
+@lru_cache(maxsize=8)
+def wheelPalette(resolution=256):
+    # The NeoPy.wheel color wheel sampled at `resolution` evenly spaced
+    # positions over 0..256, as a read-only (resolution, 3) uint8 array.
+    pos = 255 - np.arange(resolution) * (256 / resolution)
+    r = np.where(pos < 85, 255 - pos * 3, np.where(pos < 170, 0, (pos - 170) * 3))
+    g = np.where(pos < 85, 0, np.where(pos < 170, (pos - 85) * 3, 255 - (pos - 170) * 3))
+    b = np.where(pos < 85, pos * 3, np.where(pos < 170, 255 - (pos - 85) * 3, 0))
+    palette = np.clip(np.stack((r, g, b), axis=1), 0, 255).astype(np.uint8)
+    palette.setflags(write=False)
+    return palette
+
+
+@lru_cache(maxsize=16)
+def matrixIndex(w, h, number=1, start=0):
+    # Strip index of every (x, y) on a row of `number` serpentine w x h panels
+    # wired one after another, as a read-only (h, w * number) intp array
+    # indexed [y, x]. `start` is the corner of each panel's first led
+    # (NeoPy.TOP_LEFT .. BOTTOM_RIGHT); panels wired from a side corner run
+    # their serpentine rows along the panel's height.
+    y, x = np.mgrid[0:h, 0:w * number]
+    panel, x = np.divmod(x, w)
+    rowLength = w
+    if start == 1:
+        x, y = y, w - x - 1
+        rowLength = h
+    elif start == 2:
+        x, y = h - y - 1, x
+        rowLength = h
+    elif start == 3:
+        x, y = w - x - 1, h - y - 1
+    x = np.where(y % 2, rowLength - x - 1, x)
+    index = panel * (w * h) + y * rowLength + x
+    index.setflags(write=False)
+    return index
 
 
 class NeoPy():
 
-    def __init__(self, leds=0, ip = "127.0.0.1", port = 4242, ledsPerPacket=128):
+    def __init__(self, leds=0, ip = "127.0.0.1", port = 4242, ledsPerPacket=128,
+                 skipUnchanged=False, refreshInterval=1.0, compression=False, payloadBudget=None):
         self.leds = leds
-        self.strip = [(0, 0, 0) for i in range(self.leds)]
+        self.strip = np.zeros((self.leds, 3), dtype=np.uint8)
         self.brightness = 100
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.transport = None
+        self._send = self.sock.sendto
         self.matrix = False
         self.number = 1
         self.w = 1
@@ -29,9 +94,21 @@ class NeoPy():
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
         self.startled = self.TOP_LEFT
+        self._matrixIndex = matrixIndex(self.w, self.h, self.number, self.startled)
         self.ip = ip
         self.port = int(port)
         self.ledsPerPacket = ledsPerPacket
+        self.payloadBudget = checkPayloadBudget(payloadBudget)
+        self.skipUnchanged = skipUnchanged
+        self.gamma = (1.0, 1.0, 1.0)
+        self.dithering = False
+        self.compression = compression
+        self.recorder = None
+        self.refreshInterval = refreshInterval
+        self._nextRefresh = 0.0
+        self._addr = (self.ip, self.port)
+        self._buildLut()
+        self._allocPackets()
         self.show()
 
     def setStrip(self, leds, brightness, ip, port):
@@ -39,7 +116,101 @@ class NeoPy():
         self.brightness = brightness
         self.ip = ip
         self.port = int(port)
-        self.strip = [(0, 0, 0) for i in range(self.leds)]
+        self.strip = np.zeros((self.leds, 3), dtype=np.uint8)
+        self._addr = (self.ip, self.port)
+        self._buildLut()
+        self._allocPackets()
+
+    def setTransport(self, transport):
+        # Routes packets through transport.send(data, addr) instead of the
+        # blocking socket, e.g. an AsyncioTransport. None restores the socket.
+        self.transport = transport
+        self._send = transport.send if transport is not None else self.sock.sendto
+
+    def _buildLut(self):
+        # Output tables for the three channels back to back (index is
+        # value + 256 * channel), combining gamma and brightness. They are only
+        # rebuilt when one of those changes. _lut16 keeps 8 fractional bits
+        # for temporal dithering.
+        value = np.arange(256) / 255.0
+        exact = np.concatenate([255.0 * value ** gamma for gamma in self.gamma])
+        exact *= int(self.brightness) / 100.0
+        self._lut = np.minimum(np.floor(exact + 1e-9), 255).astype(np.uint8)
+        self._lut16 = np.minimum(np.floor(exact * 256 + 1e-6), 255 * 256).astype(np.uint16)
+        self._forceFull = True
+
+    def setPayloadBudget(self, budget):
+        # Bytes per datagram. When set, each segment is split into as few
+        # packets as fit the budget instead of fixed ledsPerPacket packets.
+        self.payloadBudget = checkPayloadBudget(budget)
+        self._allocPackets()
+
+    def _segments(self):
+        # (address, first led, led count, payload budget) of every receiver
+        # the strip feeds.
+        return [(self._addr, 0, len(self.strip), self.payloadBudget)]
+
+    def _packetLeds(self, length, budget):
+        # Leds per raw packet for one segment. With a budget, the fewest packets
+        # that fit it, with the leds spread evenly so only the last one is
+        # shorter; receivers take the stride from packet 0.
+        if budget is None:
+            return self.ledsPerPacket
+        maxLeds = (budget - 1) // 3
+        packets = max(1, -(-length // maxLeds))
+        return max(1, -(-length // packets))
+
+    def _allocPackets(self):
+        # One persistent buffer holding every packet back to back. Each slot is
+        # (first led, buffer offset, memoryview to send, (count, 3) payload
+        # view, address). Packet numbers restart at 0 for every segment.
+        numleds = len(self.strip)
+        layout = []
+        self._segmentList = []
+        for addr, first, length, budget in self._segments():
+            last = max(first, min(first + length, numleds))
+            stride = self._packetLeds(last - first, budget)
+            if last - first > stride * encoding.FIRST_ENCODED_TYPE:
+                raise ValueError("%d leds need more than %d packets of %d leds"
+                                 % (last - first, encoding.FIRST_ENCODED_TYPE, stride))
+            self._segmentList.append((addr, first, last, [], stride))
+            for packetNo, start in enumerate(range(first, last, stride)):
+                layout.append((addr, packetNo, start, min(stride, last - start)))
+
+        self._packetBuffer = bytearray(sum(1 + 3 * count for _, _, _, count in layout))
+        self._index = np.zeros((numleds, 3), dtype=np.intp)
+        self._output = np.zeros((numleds, 3), dtype=np.uint8)
+        self._scratch = np.zeros((numleds, 3), dtype=np.uint8)
+        # Full-size channel offsets; a broadcast (3,) operand would make the
+        # in-place add allocate a temporary on every call.
+        self._channelOffset = np.tile(np.array([0, 256, 512], dtype=np.intp), (numleds, 1))
+        # Dithering accumulator and the fractional error carried between frames.
+        # The accumulator is little-endian so its high byte (the output) and
+        # low byte (the new error) can be read through strided views.
+        self._accum = np.zeros((numleds, 3), dtype='<u2')
+        self._accumBytes = self._accum.view(np.uint8).reshape(numleds, 3, 2)
+        self._error = np.zeros((numleds, 3), dtype=np.uint16)
+        # Last successfully sent frame, used to skip unchanged packets.
+        self._sent = np.zeros((numleds, 3), dtype=np.uint8)
+        self._changed = np.zeros((numleds, 3), dtype=bool)
+        self._forceFull = True
+        self._packets = []
+        self._pending = []
+        view = memoryview(self._packetBuffer)
+        offset = 0
+        for addr, packetNo, start, count in layout:
+            size = 1 + 3 * count
+            self._packetBuffer[offset] = packetNo
+            payload = np.frombuffer(self._packetBuffer, dtype=np.uint8,
+                                    count=3 * count, offset=offset + 1).reshape(count, 3)
+            self._packets.append((start, offset, view[offset:offset + size], payload, addr))
+            offset += size
+
+        for slot in self._packets:
+            for addr, first, last, slots, stride in self._segmentList:
+                if slot[4] == addr and first <= slot[0] < last:
+                    slots.append(slot)
+                    break
 
     def is_socket_closed(self):
 
@@ -64,63 +235,257 @@ class NeoPy():
             self.number = number
             self.w = w
             self.h = h
+            self._matrixIndex = matrixIndex(w, h, number, start)
 
     def set(self, index, color):
-        if index >= 0 and index <= len(self.strip):
+        if index >= 0 and index < len(self.strip):
             self.strip[index] = color           
 
     def setPixel(self, x, y, color):
-        if self.matrix and x < (self.w * self.number) and y < self.h:
-            matr = math.floor(x / self.w)
-            if self.startled == self.TOP_RIGHT:
-                oldx = x
-                x = y
-                y = self.w - oldx - 1
-            elif self.startled == self.BOTTOM_LEFT:
-                oldx = x
-                x = self.w - y - 1
-                y = oldx
-            elif self.startled == self.BOTTOM_RIGHT:
-                x = self.w - x - 1
-                y = self.w - y - 1
-            pos = y * self.w + x
-            if y % 2:
-                pos = y * self.w + (self.w - x - 1)
-            self.set(pos, color)
+        if self.matrix and 0 <= x < (self.w * self.number) and 0 <= y < self.h:
+            self.set(self._matrixIndex[y, x], color)
+
+    def blit(self, image, x=0, y=0):
+        # Draws an (height, width, 3) image onto the matrix with its top-left
+        # corner at (x, y), clipped to the panels and the strip, as a single
+        # fancy-index assignment.
+        if not self.matrix:
+            return
+        image = np.asarray(image)
+        if x < 0:
+            image, x = image[:, -x:], 0
+        if y < 0:
+            image, y = image[-y:], 0
+        table = self._matrixIndex[y:y + image.shape[0], x:x + image.shape[1]]
+        image = image[:table.shape[0], :table.shape[1]]
+        if self.w * self.h * self.number <= len(self.strip):
+            self.strip[table] = image
+        else:
+            visible = table < len(self.strip)
+            self.strip[table[visible]] = image[visible]
 
     def setAll(self, color):
-        for i in range(len(self.strip)):
-            self.set(i, color)
+        self.strip[:] = color
+
+    # Bulk writes. Ranges are clipped to the strip and every call is a single
+    # NumPy copy, so the cost doesn't grow with Python call overhead.
+
+    def fill(self, color, start=0, count=None):
+        # Sets `count` leds from `start` (to the end by default) to one color.
+        numleds = len(self.strip)
+        lo = max(0, start)
+        hi = numleds if count is None else max(lo, min(numleds, start + count))
+        self.strip[lo:hi] = color
+
+    def setSlice(self, start, stop, colors):
+        # Assigns strip[start:stop] from one color or a matching (n, 3) array.
+        self.strip[start:stop] = colors
+
+    def write(self, data, start=0):
+        # Copies a precomputed frame into the strip from `start`: an (n, 3)
+        # array, or any buffer of packed RGB bytes. Data past the end of the
+        # strip is dropped. Returns the number of leds written.
+        if not isinstance(data, np.ndarray):
+            data = np.frombuffer(data, dtype=np.uint8)
+        data = data.reshape(-1, 3)
+        if start < 0:
+            data = data[-start:]
+            start = 0
+        count = max(0, min(len(data), len(self.strip) - start))
+        np.copyto(self.strip[start:start + count], data[:count], casting='unsafe')
+        return count
+
+    def shift(self, n, color=(0, 0, 0)):
+        # Moves every led n places towards the end of the strip (towards the
+        # start when negative), filling the vacated leds with `color`.
+        numleds = len(self.strip)
+        n = max(-numleds, min(numleds, n))
+        if n == 0:
+            return
+        np.copyto(self._scratch, self.strip)
+        if n > 0:
+            self.strip[n:] = self._scratch[:numleds - n]
+            self.strip[:n] = color
+        else:
+            self.strip[:n] = self._scratch[-n:]
+            self.strip[n:] = color
+
+    def rotate(self, n):
+        # Like shift(), but leds pushed off one end come back at the other.
+        numleds = len(self.strip)
+        if numleds == 0:
+            return
+        n %= numleds
+        if n == 0:
+            return
+        np.copyto(self._scratch, self.strip)
+        self.strip[n:] = self._scratch[:numleds - n]
+        self.strip[:n] = self._scratch[numleds - n:]
+
+    def pixels(self):
+        # Direct (N, 3) uint8 view of the framebuffer for bulk writes.
+        # The array is replaced by setStrip, so don't hold it across that call.
+        return self.strip
+
+    def setSkipUnchanged(self, enabled, refreshInterval=1.0):
+        # When enabled, show() only sends packets whose leds changed since the
+        # last show(), plus a full frame every refreshInterval seconds to
+        # recover from lost datagrams.
+        self.skipUnchanged = enabled
+        self.refreshInterval = refreshInterval
+        self._forceFull = True
+
+    def setGamma(self, gamma):
+        # Gamma exponent, either one value or an (r, g, b) tuple. 1.0 is linear;
+        # WS2812B strips look perceptually even around 2.5 to 2.8.
+        if not isinstance(gamma, (tuple, list)):
+            gamma = (gamma, gamma, gamma)
+        gamma = tuple(float(g) for g in gamma)
+        if gamma != self.gamma:
+            self.gamma = gamma
+            self._buildLut()
+
+    def setDithering(self, enabled):
+        # Temporal dithering carries each channel's fractional output across
+        # frames, so low brightness fades don't band. Every frame is then sent
+        # in full, since the output changes even when the strip doesn't.
+        self.dithering = enabled
+        self._error[:] = 0
+        self._forceFull = True
+
+    def setCompression(self, enabled):
+        # Lets show() send each frame run-length or palette encoded when that
+        # is smaller than raw packets (see encoding.py).
+        self.compression = enabled
+        self._forceFull = True
+
+    def setRecorder(self, recorder):
+        # Captures every shown frame into a showfile.ShowRecorder, or stops
+        # capturing with None.
+        self.recorder = recorder
 
     def setBrightness(self, value):
         if value >= 0 and value <= 100:
-            self.brightness = value
+            if value != self.brightness:
+                self.brightness = value
+                self._buildLut()
 
     def wheel(self, position):
-        position = 255 - position;
-        if(position < 85):
-            return (255 - position * 3, 0, position * 3);
-        if(position < 170):
-            position -= 85;
-            return (0, position * 3, 255 - position * 3);
-        position -= 170;
-        return (position * 3, 255 - position * 3, 0);
+        r, g, b = wheelPalette()[int(position) % 256]
+        return (int(r), int(g), int(b))
+
+    def wheelColors(self, positions, resolution=256, out=None):
+        # Vectorized wheel(): maps an array of positions (0..256, wrapping) to
+        # an (len(positions), 3) uint8 array with a single palette gather.
+        palette = wheelPalette(resolution)
+        index = (np.asarray(positions) * (resolution / 256)).astype(np.intp) % resolution
+        return palette.take(index, axis=0, out=out)
 
     def numPixels(self):
         return len(self.strip)
     
+    def encodeFrame(self):
+        # Encodes the whole strip without sending it. The returned bytes can be
+        # replayed with showEncoded() as long as the geometry and brightness
+        # stay the same.
+        for start, offset, packet, payload, addr in self._packets:
+            self._encode(start, start + len(payload), payload)
+        return bytes(self._packetBuffer)
+
+    def _encode(self, start, end, payload):
+        index = self._index[start:end]
+        np.copyto(index, self.strip[start:end])
+        np.add(index, self._channelOffset[start:end], out=index)
+        if self.dithering:
+            accum = self._accum[start:end]
+            error = self._error[start:end]
+            self._lut16.take(index, out=accum, mode='clip')
+            np.add(accum, error, out=accum)
+            np.copyto(payload, self._accumBytes[start:end, :, 1])
+            np.copyto(error, self._accumBytes[start:end, :, 0])
+        else:
+            self._lut.take(index, out=payload, mode='clip')
+
+    def showEncoded(self, frame, encoded):
+        # Displays a frame captured with encodeFrame(), sending its stored
+        # packets instead of encoding the strip again.
+        np.copyto(self.strip, frame)
+        self._transmit(memoryview(encoded))
+
     def show(self):
-        numleds = len(self.strip)
-        packetNo = 0
-        i = 0
-        while i < numleds:
-            seq = []
-            seq.append(packetNo)
-            while i < min((packetNo+1)*self.ledsPerPacket, numleds):
-                seq.append(int(self.strip[i][0] * self.brightness / 100))
-                seq.append(int(self.strip[i][1] * self.brightness / 100))
-                seq.append(int(self.strip[i][2] * self.brightness / 100))
-                i += 1
-
-            self.sock.sendto(bytearray(seq), (self.ip, self.port))
-            packetNo += 1
\ No newline at end of file
+        self._transmit(None)
+
+    async def showAsync(self):
+        # Awaitable show(): with a transport that supports flush(), completes
+        # once the frame's packets have left the send queue.
+        self._transmit(None)
+        if self.transport is not None and hasattr(self.transport, "flush"):
+            await self.transport.flush()
+
+    def _transmit(self, encoded):
+        full = not self.skipUnchanged or self._forceFull or self.dithering
+        if not full:
+            now = time.monotonic()
+            full = now >= self._nextRefresh
+            np.not_equal(self.strip, self._sent, out=self._changed)
+
+        pending = self._pending
+        pending.clear()
+        if self.compression and encoded is None:
+            if full or self._changed.any():
+                self._transmitCompressed()
+        else:
+            for slot in self._packets:
+                start, offset, packet, payload, addr = slot
+                end = start + len(payload)
+                if not full and not self._changed[start:end].any():
+                    continue
+                if encoded is None:
+                    self._encode(start, end, payload)
+                else:
+                    packet[:] = encoded[offset:offset + len(packet)]
+                pending.append(slot)
+            self._sendPackets(pending)
+
+        if full and self.skipUnchanged:
+            self._forceFull = False
+            self._nextRefresh = time.monotonic() + self.refreshInterval
+
+        if self.recorder is not None:
+            self.recorder.capture(time.monotonic())
+
+    def _sendPackets(self, slots):
+        for start, offset, packet, payload, addr in slots:
+            self._send(packet, addr)
+            self._sent[start:start + len(payload)] = self.strip[start:start + len(payload)]
+
+    def _transmitCompressed(self):
+        # Sends every segment whole, in whichever encoding is smallest. Encoded
+        # packets never exceed the size of a raw packet.
+        pending = self._pending
+        encoded = []
+        compressed = []
+        for addr, first, last, slots, stride in self._segmentList:
+            output = self._output[first:last]
+            self._encode(first, last, output)
+            packets = encoding.compress(output, stride, 1 + 3 * stride)
+            if packets is None:
+                for slot in slots:
+                    start, offset, packet, payload, addr = slot
+                    payload[:] = self._output[start:start + len(payload)]
+                    pending.append(slot)
+                continue
+            encoded.append((addr, first, packets))
+            compressed.append((first, last))
+        if encoded:
+            self._sendEncoded(encoded)
+            for first, last in compressed:
+                self._sent[first:last] = self.strip[first:last]
+        self._sendPackets(pending)
+
+    def _sendEncoded(self, segments):
+        # Sends compressed packets, given as (addr, first led, packets) per
+        # segment. Subclasses override this to batch and count them.
+        for addr, first, packets in segments:
+            for packet in packets:
+                self._send(packet, addr)
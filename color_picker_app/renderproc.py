@@ -0,0 +1,140 @@
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from client import Client
+import effects
+from transitions import StaticFrame, Transition
+from gradient import gradientKey, renderGradient
+
+
+def _worker(name, leds, brightness, ip, port, options, control, results):
+    shm = shared_memory.SharedMemory(name=name)
+    client = Client(leds, brightness, ip, port, **options)
+    # Render straight into the shared framebuffer.
+    client.strip = np.ndarray((leds, 3), dtype=np.uint8, buffer=shm.buf)
+    scheduler = client._scheduler
+    frames = None
+
+    try:
+        while True:
+            try:
+                message = control.get(block=frames is None)
+            except queue.Empty:
+                message = None
+
+            if message is not None:
+                command = message[0]
+                if command == "start":
+                    effect = client.effect(message[1])
+                    period = message[2] or 0.04
+                    if message[3]:
+                        effect = Transition(client, effect, round(message[3] / period))
+                    frames = client.play(effect, period)
+                elif command == "stop":
+                    # Every stop is answered, with None if nothing was running.
+                    results.put(scheduler.stats() if frames is not None else None)
+                    if frames is not None:
+                        frames = None
+                        if message[1]:
+                            # Fade out from the last frame; the loop ends by itself.
+                            black = StaticFrame(client, (0, 0, 0))
+                            period = scheduler.period
+                            frames = client.play(Transition(client, black, round(message[1] / period)), period)
+                elif command == "color":
+                    frames = None
+                    if message[2]:
+                        # Fades run in this loop, starting from the shared frame.
+                        target = StaticFrame(client, message[1])
+                        period = scheduler.period
+                        frames = client.play(Transition(client, target, round(message[2] / period)), period)
+                    else:
+                        client.setColor(message[1])
+                elif command == "gradient":
+                    frames = None
+                    if message[3]:
+                        client.gradient = gradientKey(message[2], message[1])
+                        target = StaticFrame(client, renderGradient(*client.gradient, leds))
+                        period = scheduler.period
+                        frames = client.play(Transition(client, target, round(message[3] / period)), period)
+                    else:
+                        client.setGradient(message[1], message[2])
+                elif command == "brightness":
+                    client.setBrightness(message[1])
+                elif command == "shutdown":
+                    break
+
+            if frames is not None and next(frames, None) is None:
+                frames = None
+    finally:
+        del client.strip
+        shm.close()
+
+
+class RenderProcess():
+
+    # Runs animations in a separate process, so rendering and sending don't
+    # share the GIL with the GUI. The child renders into a shared memory
+    # framebuffer, readable here as `frame`; the GUI only sends control
+    # messages: start, stop, color, gradient, brightness and shutdown.
+
+    def __init__(self, leds, brightness, ip, port, **options):
+        self.leds = leds
+        context = multiprocessing.get_context("spawn")
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, leds * 3))
+        self.frame = np.ndarray((leds, 3), dtype=np.uint8, buffer=self._shm.buf)
+        self.frame[:] = 0
+        self._control = context.Queue()
+        self._results = context.Queue()
+        self._stats = None
+        self._pendingStops = 0
+        self._process = context.Process(
+            target=_worker, daemon=True,
+            args=(self._shm.name, leds, brightness, ip, port, options, self._control, self._results))
+        self._process.start()
+
+    def startAnimation(self, mode, delay=None, duration=0):
+        # Effects are sent by name, so they must be registered on import of a
+        # module the child process also imports (like effects.py).
+        self._control.put(("start", effects.lookup(mode).name, delay, duration))
+
+    def stopAnimation(self, duration=0):
+        self._control.put(("stop", duration))
+        self._pendingStops += 1
+
+    def animationStats(self, timeout=0.5):
+        # Stats of the run ended by the last stopAnimation(), or None if
+        # nothing was running. Reads the child's answers to every stop sent
+        # so far, so answers to stops nobody asked about don't linger.
+        while self._pendingStops:
+            try:
+                self._stats = self._results.get(timeout=timeout)
+            except queue.Empty:
+                break
+            self._pendingStops -= 1
+        return self._stats
+
+    def setColor(self, color, duration=0):
+        self._control.put(("color", tuple(color), duration))
+
+    def setGradient(self, colors, points, duration=0):
+        self._control.put(("gradient", list(colors), list(points), duration))
+
+    def setBrightness(self, value):
+        self._control.put(("brightness", value))
+
+    def shutdown(self, timeout=2.0):
+        # Asks the child to exit, then kills it if it doesn't within `timeout`.
+        if self._process.is_alive():
+            self._control.put(("shutdown",))
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+        del self.frame
+        self._control.close()
+        self._results.close()
+        self._shm.close()
+        self._shm.unlink()
@@ -0,0 +1,64 @@
+import time
+import math
+
+
+class FrameScheduler():
+
+    def __init__(self, fps=25):
+        self.setFps(fps)
+        self.reset()
+
+    def setFps(self, fps):
+        self.fps = fps
+        self.period = 1.0 / fps
+
+    def setPeriod(self, period):
+        self.setFps(1.0 / period)
+
+    def reset(self):
+        self.frame = 0
+        self.framesShown = 0
+        self.skippedFrames = 0
+        self._start = time.monotonic()
+        self._last = None
+        self._errorMean = 0.0
+        self._errorM2 = 0.0
+        self._intervals = 0
+
+    def wait(self):
+        # Sleeps until the next frame deadline and returns its index on the
+        # animation timeline. Deadlines are absolute (start + frame * period),
+        # so render and send time never accumulate as drift. When rendering
+        # falls behind, the late frames are skipped instead of replayed.
+        self.frame += 1
+        self.framesShown += 1
+        deadline = self._start + self.frame * self.period
+        now = time.monotonic()
+        if now < deadline:
+            time.sleep(deadline - now)
+            now = time.monotonic()
+        else:
+            behind = int((now - deadline) / self.period)
+            self.frame += behind
+            self.skippedFrames += behind
+
+        if self._last is not None:
+            # Welford's running variance of the frame interval error.
+            error = (now - self._last) - self.period
+            self._intervals += 1
+            delta = error - self._errorMean
+            self._errorMean += delta / self._intervals
+            self._errorM2 += delta * (error - self._errorMean)
+        self._last = now
+        return self.frame
+
+    def stats(self):
+        elapsed = time.monotonic() - self._start
+        jitter = math.sqrt(self._errorM2 / self._intervals) if self._intervals > 1 else 0.0
+        return {
+            "fps": self.framesShown / elapsed if elapsed > 0 else 0.0,
+            "target_fps": self.fps,
+            "jitter": jitter,
+            "skipped": self.skippedFrames,
+            "frames": self.framesShown,
+        }
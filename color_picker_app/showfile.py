@@ -0,0 +1,268 @@
+"""
+Show files: pre-rendered sequences for NeoPy.
+
+A show file is a 64-byte little-endian header followed by fixed-size frame
+records, so frame i lives at HEADER_SIZE + i * recordSize and any frame can
+be reached without reading the ones before it.
+
+    magic        8s   b"NEOSHOW1"
+    leds         u32
+    fps          f64
+    encoding     u8   ENCODING_RGB or ENCODING_PACKETS
+    ledsPerPacket u32 packet layout of the recording strip
+    packetSize   u32  bytes of encoded packets per frame (0 for RGB)
+    frameCount   u64  written when the recorder is closed
+
+ENCODING_RGB records hold the raw (leds, 3) framebuffer and are re-encoded
+on playback, so brightness and gamma still apply. ENCODING_PACKETS records
+hold the framebuffer followed by the strip's encoded packets, which the
+player copies straight into the packet buffers; they only play back on a
+strip with the same packet layout.
+"""
+
+import mmap
+import struct
+from threading import Thread
+
+import numpy as np
+
+from scheduler import FrameScheduler
+
+
+MAGIC = b"NEOSHOW1"
+HEADER = struct.Struct("<8sIdBxxxIIQ")
+HEADER_SIZE = 64
+
+ENCODING_RGB = 0
+ENCODING_PACKETS = 1
+ENCODINGS = {"rgb": ENCODING_RGB, "packets": ENCODING_PACKETS}
+
+
+class ShowRecorder():
+
+    # Appends frames of a NeoPy strip to a show file. record() renders an
+    # effect offline without sending anything; capture() stores the frame the
+    # strip last showed, and setRecorder(recorder) on the strip captures every
+    # frame it shows during a live session. Live frames are placed on the
+    # show's timeline by when they were shown: gaps repeat the previous frame
+    # and frames sharing a slot keep the latest.
+
+    def __init__(self, path, strip, fps=25, encoding="packets"):
+        if encoding not in ENCODINGS:
+            raise ValueError("unknown encoding %r, expected one of %s" % (encoding, ", ".join(ENCODINGS)))
+        self.path = path
+        self.strip = strip
+        self.fps = fps
+        self.encoding = ENCODINGS[encoding]
+        self.leds = strip.numPixels()
+        self.frameSize = self.leds * 3
+        self.packetSize = len(strip._packetBuffer) if self.encoding == ENCODING_PACKETS else 0
+        self.recordSize = self.frameSize + self.packetSize
+        self.frames = 0
+        self._record = np.zeros(self.recordSize, dtype=np.uint8)
+        self._start = None
+        self._file = open(path, "wb")
+        self._writeHeader()
+
+    def _writeHeader(self):
+        header = HEADER.pack(MAGIC, self.leds, self.fps, self.encoding,
+                             self.strip.ledsPerPacket, self.packetSize, self.frames)
+        self._file.seek(0)
+        self._file.write(header.ljust(HEADER_SIZE, b"\0"))
+        self._file.seek(HEADER_SIZE + self.frames * self.recordSize)
+
+    def _checkStrip(self):
+        if self.strip.numPixels() != self.leds:
+            raise ValueError("strip has %d leds, show was started with %d" % (self.strip.numPixels(), self.leds))
+
+    def _write(self, timestamp):
+        # Writes self._record at the slot for `timestamp`, or as the next
+        # frame without one.
+        if timestamp is None:
+            slot = self.frames
+        else:
+            if self._start is None:
+                self._start = timestamp - self.frames / self.fps
+            slot = round((timestamp - self._start) * self.fps)
+
+        if slot < self.frames and self.frames:
+            self._file.seek(HEADER_SIZE + (self.frames - 1) * self.recordSize)
+            self._file.write(self._record)
+            self._last[:] = self._record
+            return
+        if self.frames:
+            for _ in range(slot - self.frames):
+                self._file.write(self._last)
+                self.frames += 1
+        self._file.write(self._record)
+        self.frames += 1
+        self._last = self._record.copy()
+
+    def capture(self, timestamp=None):
+        # Stores the frame the strip last showed, at `timestamp` (monotonic
+        # seconds) when given. Doesn't encode anything, so dithering state
+        # is left alone.
+        strip = self.strip
+        self._checkStrip()
+        record = self._record
+        record[:self.frameSize] = strip.strip.reshape(-1)
+        if self.encoding == ENCODING_PACKETS:
+            record[self.frameSize:] = np.frombuffer(strip._packetBuffer, dtype=np.uint8)
+            if strip.compression:
+                # Compressed frames don't go through the packet buffer, but
+                # their encoded output is left in strip._output.
+                packets = record[self.frameSize:]
+                for start, offset, packet, payload, addr in strip._packets:
+                    packets[offset + 1:offset + len(packet)] = strip._output[start:start + len(payload)].reshape(-1)
+        self._write(timestamp)
+
+    def record(self, mode, frames, start=0):
+        # Renders frames start..start+frames of a Client effect into the show.
+        strip = self.strip
+        self._checkStrip()
+        effect = strip.effect(mode)
+        for frame in range(start, start + frames):
+            effect.render(frame, strip.strip)
+            self._record[:self.frameSize] = strip.strip.reshape(-1)
+            if self.encoding == ENCODING_PACKETS:
+                self._record[self.frameSize:] = np.frombuffer(strip.encodeFrame(), dtype=np.uint8)
+            self._write(None)
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.strip.recorder is self:
+            self.strip.setRecorder(None)
+        self._writeHeader()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ShowPlayer():
+
+    # Plays a show file on a NeoPy strip. The file is memory-mapped and
+    # frames are views into it, so shows larger than memory play fine and no
+    # frame is rendered; packet-encoded frames go straight into the strip's
+    # packet buffers. Frames are shown on the FrameScheduler's absolute
+    # timeline at the recorded fps, skipping late frames to keep time.
+
+    def __init__(self, path, strip):
+        self.path = path
+        self.strip = strip
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER_SIZE:
+            self.close()
+            raise ValueError("%s is not a show file" % path)
+        (magic, self.leds, self.fps, self.encoding, self.ledsPerPacket,
+         self.packetSize, frameCount) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("%s is not a show file" % path)
+
+        self.frameSize = self.leds * 3
+        self.recordSize = self.frameSize + self.packetSize
+        # A recording that was never closed still has a frame count of 0.
+        available = (len(self._mmap) - HEADER_SIZE) // self.recordSize if self.recordSize else 0
+        self.frameCount = min(frameCount, available) if frameCount else available
+        self._records = np.frombuffer(self._mmap, dtype=np.uint8, count=self.frameCount * self.recordSize,
+                                      offset=HEADER_SIZE).reshape(self.frameCount, self.recordSize)
+        self.checkStrip()
+
+        self.position = 0
+        self._seek = None
+        self._scheduler = FrameScheduler(self.fps)
+        self._running = False
+        self._thread = None
+
+    def checkStrip(self):
+        if self.strip.numPixels() != self.leds:
+            raise ValueError("show has %d leds, strip has %d" % (self.leds, self.strip.numPixels()))
+        if self.encoding == ENCODING_PACKETS and len(self.strip._packetBuffer) != self.packetSize:
+            raise ValueError("show was recorded with a different packet layout (%d leds per packet)"
+                             % self.ledsPerPacket)
+
+    def duration(self):
+        return self.frameCount / self.fps
+
+    def seek(self, frame):
+        # Moves playback to `frame`; a running play() continues from there.
+        self.position = max(0, min(int(frame), self.frameCount - 1))
+        self._seek = self.position
+
+    def seekTime(self, seconds):
+        self.seek(round(seconds * self.fps))
+
+    def frame(self, index):
+        # The (leds, 3) framebuffer of a frame, as a read-only view.
+        return self._records[index, :self.frameSize].reshape(self.leds, 3)
+
+    def showFrame(self, index):
+        record = self._records[index]
+        if self.encoding == ENCODING_PACKETS:
+            self.strip.showEncoded(self.frame(index), record[self.frameSize:])
+        else:
+            np.copyto(self.strip.strip, self.frame(index))
+            self.strip.show()
+        self.position = index + 1
+
+    def play(self, loop=False):
+        # Generator driving playback from the current position: shows one
+        # frame per scheduler tick and yields its index. Ends at the last
+        # frame unless looping.
+        if not self.frameCount:
+            return
+        self._scheduler.setFps(self.fps)
+        self._scheduler.reset()
+        self._seek = None
+        start = self.position
+        tick = 0
+        while True:
+            if self._seek is not None:
+                start, self._seek = self._seek - tick, None
+            index = start + tick
+            if index >= self.frameCount:
+                if not loop:
+                    return
+                index %= self.frameCount
+            self.showFrame(index)
+            yield index
+            tick = self._scheduler.wait()
+
+    def start(self, loop=False):
+        self._running = True
+        self._thread = Thread(target=lambda: self._run(loop), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, loop):
+        for _ in self.play(loop):
+            if not self._running:
+                break
+        self._running = False
+
+    def stats(self):
+        return self._scheduler.stats()
+
+    def close(self):
+        self.stop()
+        # Views into the map have to go before it can be closed.
+        self._records = None
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+import encoding
+
+
+def frames():
+    rng = np.random.default_rng(0)
+    solid = np.zeros((300, 3), dtype=np.uint8)
+    solid[:] = (10, 20, 30)
+    runs = np.zeros((300, 3), dtype=np.uint8)
+    runs[150:] = (255, 0, 0)
+    palette = rng.integers(0, 256, (16, 3), dtype=np.uint8)
+    sixteen = palette[np.arange(300) % 16]
+    noise = rng.integers(0, 256, (300, 3), dtype=np.uint8)
+    return {"solid": solid, "runs": runs, "sixteen": sixteen, "noise": noise}
+
+
+def roundTrip(frame, ledsPerPacket, maxPacket):
+    packets = encoding.compress(frame, ledsPerPacket, maxPacket)
+    if packets is None:
+        return None
+    assert packets, "compress returned no packets"
+    strip = np.zeros_like(frame)
+    for packet in packets:
+        assert len(packet) <= maxPacket
+        assert encoding.decode(packet, strip, ledsPerPacket) is not None
+    np.testing.assert_array_equal(strip, frame)
+    return packets
+
+
+@pytest.mark.parametrize("name", ["solid", "runs", "sixteen", "noise"])
+@pytest.mark.parametrize("ledsPerPacket", [1, 2, 13, 128])
+def test_round_trip(name, ledsPerPacket):
+    roundTrip(frames()[name], ledsPerPacket, 1 + 3 * ledsPerPacket)
+
+
+@pytest.mark.parametrize("maxPacket", [1, 4, 5, 8, 9, 40, 56, 57])
+def test_small_packets_fall_back_or_round_trip(maxPacket):
+    for frame in frames().values():
+        roundTrip(frame, 13, maxPacket)
+
+
+def test_too_small_for_any_encoding_uses_raw():
+    runs = frames()["runs"][:2]
+    runs[1] = (1, 2, 3)
+    assert encoding.compress(runs, 1, 4) is None
+    assert encoding.compress(frames()["sixteen"], 13, 40) is None
+
+
+def test_solid_frame_is_one_rle_packet():
+    packets = roundTrip(frames()["solid"], 128, 385)
+    assert len(packets) == 1 and packets[0][0] == encoding.RLE
@@ -0,0 +1,77 @@
+from functools import lru_cache
+
+import numpy as np
+
+from effects import Effect
+
+
+EASINGS = {
+    "linear": lambda t: t,
+    "ease_in": lambda t: t * t * t,
+    "ease_out": lambda t: 1 - (1 - t) ** 3,
+    "smooth": lambda t: t * t * (3 - 2 * t),
+}
+
+
+@lru_cache(maxsize=64)
+def easingCurve(easing, steps):
+    # Blend weights for frames 0..steps of a transition, as a read-only
+    # float32 array running from 0 to exactly 1.
+    if easing not in EASINGS:
+        raise ValueError("unknown easing %r, expected one of %s" % (easing, ", ".join(EASINGS)))
+    curve = EASINGS[easing](np.linspace(0.0, 1.0, steps + 1)).astype(np.float32)
+    curve.setflags(write=False)
+    return curve
+
+
+class StaticFrame(Effect):
+
+    # A fixed frame, from one color or an (N, 3) array, as a transition target.
+
+    name = "STATIC"
+
+    def __init__(self, client, colors):
+        Effect.__init__(self, client)
+        self.colors = np.asarray(colors, dtype=np.uint8)
+
+    def render(self, frame, out):
+        out[:] = self.colors
+
+
+class Transition(Effect):
+
+    # Crossfades from whatever the strip holds when the transition starts (the
+    # last frame shown, possibly mid-way through another transition) to a
+    # target effect over `steps` frames. Once done the driver loop carries on
+    # with `next`: the target for animations, or nothing for static frames.
+
+    name = "TRANSITION"
+
+    def __init__(self, client, target, steps, easing="smooth"):
+        Effect.__init__(self, client)
+        self.target = target
+        self.next = None if isinstance(target, StaticFrame) else target
+        self.curve = easingCurve(easing, max(1, int(steps)))
+        self.finished = False
+        self._start = None
+
+    def render(self, frame, out):
+        if self._start is None or self._from.shape != out.shape:
+            self._start = frame
+            self._from = out.astype(np.float32)
+            self._target = np.zeros(out.shape, dtype=np.uint8)
+            self._blend = np.zeros(out.shape, dtype=np.float32)
+
+        step = frame - self._start
+        self.target.render(frame, self._target)
+        if step >= len(self.curve) - 1:
+            self.finished = True
+            np.copyto(out, self._target)
+            return
+
+        # from + t * (target - from), rounded.
+        np.subtract(self._target, self._from, out=self._blend)
+        self._blend *= self.curve[step]
+        self._blend += self._from
+        self._blend += 0.5
+        np.copyto(out, self._blend, casting='unsafe')
@@ -0,0 +1,101 @@
+import asyncio
+from threading import Thread
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    def error_received(self, exc):
+        self._owner.errors += 1
+
+    def pause_writing(self):
+        self._owner._writable.clear()
+
+    def resume_writing(self):
+        self._owner._writable.set()
+
+
+class AsyncioTransport():
+
+    # Non-blocking UDP backend for NeoPy built on an asyncio datagram endpoint.
+    # send() only hands the packet to the event loop, so callers on the Qt GUI
+    # thread never wait on the network. Without a loop argument the transport
+    # runs its own loop on a daemon thread; pass a running loop (e.g. a qasync
+    # QEventLoop) to share the Qt event loop instead.
+
+    def __init__(self, loop=None, maxQueue=256):
+        self.maxQueue = maxQueue
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+        self._thread = None
+        self._queue = asyncio.Queue(maxQueue)
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            self._thread = Thread(target=loop.run_forever, daemon=True)
+            self._thread.start()
+        self.loop = loop
+
+        ready = asyncio.run_coroutine_threadsafe(self._open(), self.loop)
+        if self._thread is not None:
+            ready.result()
+
+    async def _open(self):
+        self._transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(self), local_addr=("0.0.0.0", 0))
+        self._sender = self.loop.create_task(self._drain())
+
+    async def _drain(self):
+        while True:
+            data, addr = await self._queue.get()
+            await self._writable.wait()
+            self._transport.sendto(data, addr)
+            self.sent += 1
+            self._queue.task_done()
+
+    def _enqueue(self, data, addr):
+        # Bounded queue: when the network can't keep up, the oldest packet is
+        # dropped so the strip converges on the newest frame.
+        if self._queue.full():
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self.dropped += 1
+        self._queue.put_nowait((data, addr))
+
+    def send(self, data, addr):
+        # Fire and forget, safe from any thread. NeoPy reuses its packet
+        # buffers, so the payload is copied before it is queued.
+        self.loop.call_soon_threadsafe(self._enqueue, bytes(data), addr)
+
+    async def sendAsync(self, data, addr):
+        # Awaitable send for coroutines on the transport's loop. Waits for queue
+        # space instead of dropping, so producers slow down to the network rate.
+        await self._queue.put((bytes(data), addr))
+
+    def flush(self):
+        # Awaitable that completes once every queued packet was handed to the OS.
+        future = asyncio.run_coroutine_threadsafe(self._queue.join(), self.loop)
+        return asyncio.wrap_future(future)
+
+    async def _close(self):
+        # The sender has to see its cancellation before the loop stops, or the
+        # task is destroyed while still pending.
+        self._sender.cancel()
+        try:
+            await self._sender
+        except asyncio.CancelledError:
+            pass
+        self._transport.close()
+
+    def close(self):
+        closed = asyncio.run_coroutine_threadsafe(self._close(), self.loop)
+        if self._thread is not None:
+            closed.result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()